@@ -3,14 +3,25 @@
 import asyncio
 import os
 import logging
+import time
+from collections import OrderedDict, defaultdict
 from typing import Optional, Dict, Any
-from modules.im import BaseIMClient, MessageContext, IMFactory
+from config import paths
+from config.v2_config import UpdateConfig, V2Config
+from modules.im import (
+    BaseIMClient,
+    MessageContext,
+    IMFactory,
+    InlineKeyboard,
+    InlineButton,
+)
 from modules.im.formatters import SlackFormatter
 from modules.agent_router import AgentRouter
 from modules.agents import AgentService, ClaudeAgent, CodexAgent, OpenCodeAgent
+from modules.agents.opencode import OpenCodeServerManager
 from modules.claude_client import ClaudeClient
 from modules.session_manager import SessionManager
-from modules.settings_manager import SettingsManager
+from modules.settings_manager import SettingsManager, ChannelRouting
 from core.handlers import (
     CommandHandlers,
     SessionHandler,
@@ -18,14 +29,61 @@ from core.handlers import (
     MessageHandler,
 )
 from core.update_checker import UpdateChecker
-from core.gist_service import get_git_diff
+from core.gist_service import create_full_diff_gist
 
 logger = logging.getLogger(__name__)
 
+# Sentinel distinguishing "not cached" from a cached None routing
+_MISSING = object()
+
+# Constant strings for the per-turn diff notification, hoisted so the hot
+# result path doesn't rebuild them on every agent turn
+_DIFF_NOTIFY_TEXT = "📝 *有代码变更*"
+_DIFF_NOTIFY_BUTTON_LABEL = "📊 查看 Git 变更"
+
+# Canonical message types rendered as consolidated Log Messages; precomputed
+# so the per-chunk membership test doesn't rebuild a set literal
+_LOG_TYPES = frozenset({"system", "assistant", "toolcall"})
+
+
+def _deep_get(d: Any, *keys: str) -> Any:
+    """Walk nested dicts without allocating `{}` sentinels at each level.
+
+    Returns None as soon as a level is missing or not a dict.
+    """
+    for k in keys:
+        if not isinstance(d, dict):
+            return None
+        d = d.get(k)
+        if d is None:
+            return None
+    return d
+
 
 class Controller:
     """Main controller that coordinates all bot operations"""
 
+    # Number of lock stripes for consolidated messages (must be a power of two)
+    CONSOLIDATED_LOCK_STRIPES = 64
+    # Max conversation rounds tracked for consolidated message IDs/buffers
+    CONSOLIDATED_STATE_CAP = 1024
+    # Max channels whose routing override is cached between settings changes
+    ROUTING_CACHE_CAP = 256
+    # Debounce window (seconds) for coalescing consolidated message edits
+    CONSOLIDATED_FLUSH_DELAY = 0.15
+    # Max seconds a sustained chunk stream may postpone a consolidated flush
+    CONSOLIDATED_MAX_COALESCE_AGE = 0.75
+    # Idle seconds after which a per-key log worker retires itself
+    LOG_WORKER_IDLE_TIMEOUT = 60.0
+    # Min seconds between full traceback captures per error bucket
+    TRACEBACK_LOG_INTERVAL = 60.0
+    # Seconds the OpenCode agents/models/config fetch stays fresh per cwd
+    OPENCODE_DATA_TTL = 2.0
+    # Debounce window (seconds) for coalescing routing-modal rebuilds
+    MODAL_DEBOUNCE_DELAY = 0.2
+    # Max users whose App Home channel selection is remembered
+    HOME_SELECTED_CAP = 10000
+
     def __init__(self, config):
         """Initialize controller with configuration"""
         self.config = config
@@ -35,10 +93,81 @@ class Controller:
         self.receiver_tasks: Dict[str, asyncio.Task] = {}
         self.stored_session_mappings: Dict[str, str] = {}
 
-        self._consolidated_message_ids: Dict[str, str] = {}
-        self._consolidated_message_buffers: Dict[str, str] = {}
-        self._consolidated_message_locks: Dict[str, asyncio.Lock] = {}
-        self._home_selected_channels: Dict[str, str] = {}
+        # Bounded LRU: old conversation rounds are evicted once the cap is hit
+        # so long-running bots don't accumulate state for every round ever seen.
+        self._consolidated_message_ids: "OrderedDict[str, str]" = OrderedDict()
+        # Buffers hold lists of chunk/separator parts, joined only at flush
+        self._consolidated_message_buffers: "OrderedDict[str, list]" = OrderedDict()
+        # UTF-8 byte length of each buffer, maintained incrementally so the
+        # hot path doesn't re-encode the whole buffer per streamed chunk.
+        self._consolidated_message_byte_lens: Dict[str, int] = {}
+        # Flush bookkeeping: dirty keys awaiting a flush, and how many buffer
+        # parts the current Slack message already shows (used to split at a
+        # clean boundary).
+        self._consolidated_dirty: set = set()
+        self._consolidated_flushed_parts: Dict[str, int] = {}
+        # One queue per conversation round; a single consumer worker per key
+        # drains it and owns all append/flush/clear sequencing, so producers
+        # never lock on the emit hot path (see _log_worker_loop).
+        self._log_queues: Dict[str, asyncio.Queue] = {}
+        # Fixed pool of locks indexed by key hash; with the per-key worker
+        # these are nearly always uncontended and only guard the shared
+        # stores against the direct (worker-less) flush/clear paths.
+        self._consolidated_lock_stripes = tuple(
+            asyncio.Lock() for _ in range(self.CONSOLIDATED_LOCK_STRIPES)
+        )
+        # App Home channel selection per user; bounded LRU so long-running
+        # deployments don't accumulate an entry for every user ever seen.
+        self._home_selected_channels: "OrderedDict[str, str]" = OrderedDict()
+
+        # Strong references to fire-and-forget tasks; asyncio only keeps a
+        # weak reference, so unreferenced tasks can be garbage collected
+        # mid-flight. Done tasks remove themselves via the done callback.
+        self._background_tasks: set = set()
+
+        # Resolved working directory per settings key; invalidated when the
+        # custom CWD changes so the hot message path skips os.path syscalls.
+        self._cwd_cache: Dict[str, str] = {}
+
+        # Channel routing overrides, cached per settings key so a single
+        # inbound message doesn't traverse the settings store several times.
+        self._routing_cache: "OrderedDict[str, Any]" = OrderedDict()
+        # Serializes read-modify-write of a channel's routing settings so
+        # concurrent App Home dropdown changes can't lose updates.
+        self._routing_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+        # When a hot-path error last had its traceback captured, per bucket;
+        # repeated failures (e.g. a Slack outage) log one line, not N stacks.
+        self._last_traceback_log: Dict[str, float] = {}
+
+        # Parsed V2 config, reused while the file's mtime is unchanged so
+        # modal/App Home refreshes don't re-read and re-parse it from disk.
+        self._v2config_cache = None
+        self._v2config_mtime: Optional[int] = None
+        # Second-level cache of the OpenCode env vars so a no-op save from
+        # the modal doesn't even touch the filesystem.
+        self._cached_opencode_env_vars: Optional[Dict[str, str]] = None
+
+        # OpenCode agents/models/config fetches, deduplicated per cwd: one
+        # in-flight future shared by concurrent callers plus a short TTL
+        # cache absorbing bursts of modal updates.
+        self._opencode_data_inflight: Dict[str, asyncio.Future] = {}
+        self._opencode_data_cache: Dict[str, Any] = {}
+
+        # Pending debounced modal rebuild per view_id; a newer dropdown
+        # change cancels the older task so only the latest state renders.
+        self._modal_debounce: Dict[str, asyncio.Task] = {}
+        # Hash of the last state rendered per view_id so idempotent updates
+        # (re-selecting the same option) skip the views.update round trip.
+        self._last_modal_state: Dict[str, int] = {}
+
+        # Sorted backend list, rebuilt only when the agent registry changes.
+        self._registered_backends_cache: list = []
+        self._registered_backends_ver = -1
+
+        # Event loop the IM client runs on, captured when it comes up so
+        # shutdown can target it instead of spinning up a throwaway loop.
+        self._im_loop: Optional[asyncio.AbstractEventLoop] = None
 
         # Initialize core modules
         self._init_modules()
@@ -56,8 +185,6 @@ class Controller:
         self.cleanup_task: Optional[asyncio.Task] = None
 
         # Initialize update checker (use default config if not present)
-        from config.v2_config import UpdateConfig
-
         update_config = getattr(config, "update", None) or UpdateConfig()
         self.update_checker = UpdateChecker(self, update_config)
 
@@ -76,6 +203,33 @@ class Controller:
         self.im_client.formatter = formatter
         self.claude_client = ClaudeClient(self.config.claude, formatter)
 
+        # Resolve optional IM client capabilities once; hasattr walks the
+        # MRO on every call and these are checked on hot message paths.
+        self._cap_upload_markdown = hasattr(self.im_client, "upload_markdown")
+        self._cap_send_with_buttons = hasattr(
+            self.im_client, "send_message_with_buttons"
+        )
+        self._cap_delete_message = hasattr(self.im_client, "delete_message")
+        self._cap_remove_kbd = hasattr(self.im_client, "remove_inline_keyboard")
+
+        # Bound methods for Slack-only surfaces, resolved once instead of
+        # hasattr-probing on every event (None when the platform lacks them).
+        self._im_update_routing_modal = getattr(
+            self.im_client, "update_routing_modal", None
+        )
+        self._im_publish_app_home = getattr(self.im_client, "publish_app_home", None)
+        self._im_get_bot_channels = getattr(self.im_client, "get_bot_channels", None)
+        self._im_open_env_vars_modal = getattr(
+            self.im_client, "open_env_vars_modal", None
+        )
+
+        # Shutdown hooks: resolve once whether stop/shutdown are coroutines
+        # so cleanup_sync is a plain boolean branch.
+        self._im_stop = getattr(self.im_client, "stop", None)
+        self._im_stop_is_coro = asyncio.iscoroutinefunction(self._im_stop)
+        self._im_shutdown = getattr(self.im_client, "shutdown", None)
+        self._im_shutdown_is_coro = asyncio.iscoroutinefunction(self._im_shutdown)
+
         # Initialize managers
         self.session_manager = SessionManager()
         self.settings_manager = SettingsManager()
@@ -112,6 +266,19 @@ class Controller:
         # Set cross-references between handlers
         self.message_handler.set_session_handler(self.session_handler)
 
+        # Build the command-handler mapping once; re-registration reuses it
+        self._command_handlers = {
+            "start": self.command_handler.handle_start,
+            "clear": self.command_handler.handle_clear,
+            "cwd": self.command_handler.handle_cwd,
+            "set_cwd": self.command_handler.handle_set_cwd,
+            "settings": self.settings_handler.handle_settings,
+            "stop": self.command_handler.handle_stop,
+            "sessions": self.command_handler.handle_sessions,
+            "diff": self.command_handler.handle_diff,
+            "help": self.command_handler.handle_help,
+        }
+
     def _init_agents(self):
         self.agent_service = AgentService(self)
         self.agent_service.register(ClaudeAgent(self))
@@ -119,32 +286,19 @@ class Controller:
             try:
                 self.agent_service.register(CodexAgent(self, self.config.codex))
             except Exception as e:
-                logger.error(f"Failed to initialize Codex agent: {e}")
+                logger.error("Failed to initialize Codex agent: %s", e)
         if self.config.opencode:
             try:
                 self.agent_service.register(OpenCodeAgent(self, self.config.opencode))
             except Exception as e:
-                logger.error(f"Failed to initialize OpenCode agent: {e}")
+                logger.error("Failed to initialize OpenCode agent: %s", e)
 
     def _setup_callbacks(self):
         """Setup callback connections between modules"""
-        # Create command handlers dict
-        command_handlers = {
-            "start": self.command_handler.handle_start,
-            "clear": self.command_handler.handle_clear,
-            "cwd": self.command_handler.handle_cwd,
-            "set_cwd": self.command_handler.handle_set_cwd,
-            "settings": self.settings_handler.handle_settings,
-            "stop": self.command_handler.handle_stop,
-            "sessions": self.command_handler.handle_sessions,
-            "diff": self.command_handler.handle_diff,
-            "help": self.command_handler.handle_help,
-        }
-
         # Register callbacks with the IM client
         self.im_client.register_callbacks(
             on_message=self.message_handler.handle_user_message,
-            on_command=command_handlers,
+            on_command=self._command_handlers,
             on_callback_query=self.message_handler.handle_callback_query,
             on_settings_update=self.handle_settings_update,
             on_change_cwd=self.handle_change_cwd_submission,
@@ -164,21 +318,24 @@ class Controller:
         Used to restore active poll loops that were interrupted by restart.
         """
         logger.info("IM client ready, checking for active polls to restore...")
+        # Remember the client's loop so cleanup_sync can drive async
+        # shutdown on it from the main thread.
+        self._im_loop = asyncio.get_running_loop()
         opencode_agent = self.agent_service.agents.get("opencode")
         if opencode_agent and hasattr(opencode_agent, "restore_active_polls"):
             try:
                 restored = await opencode_agent.restore_active_polls()
                 if restored > 0:
-                    logger.info(f"Restored {restored} active OpenCode poll(s)")
+                    logger.info("Restored %s active OpenCode poll(s)", restored)
             except Exception as e:
-                logger.error(f"Failed to restore active polls: {e}", exc_info=True)
+                logger.error("Failed to restore active polls: %s", e, exc_info=True)
 
         # Start update checker and send any pending post-update notification
         try:
             await self.update_checker.check_and_send_post_update_notification()
             self.update_checker.start()
         except Exception as e:
-            logger.error(f"Failed to start update checker: {e}", exc_info=True)
+            logger.error("Failed to start update checker: %s", e, exc_info=True)
 
     # Utility methods used by handlers
 
@@ -189,6 +346,17 @@ class Controller:
         # Get the settings key based on context
         settings_key = self._get_settings_key(context)
 
+        # Fast path: result is stable per channel until explicitly invalidated
+        cached = self._cwd_cache.get(settings_key)
+        if cached is not None:
+            return cached
+
+        resolved = self._resolve_cwd(settings_key)
+        self._cwd_cache[settings_key] = resolved
+        return resolved
+
+    def _resolve_cwd(self, settings_key: str) -> str:
+        """Resolve working directory for a settings key (uncached)."""
         # Get custom CWD from settings
         custom_cwd = self.settings_manager.get_custom_cwd(settings_key)
 
@@ -200,11 +368,11 @@ class Controller:
             # Try to create it
             try:
                 os.makedirs(abs_path, exist_ok=True)
-                logger.info(f"Created custom CWD: {abs_path}")
+                logger.info("Created custom CWD: %s", abs_path)
                 return abs_path
             except OSError as e:
                 logger.warning(
-                    f"Failed to create custom CWD '{abs_path}': {e}, using default"
+                    "Failed to create custom CWD '%s': %s, using default", abs_path, e
                 )
 
         # Fall back to default from config.json
@@ -215,35 +383,97 @@ class Controller:
         # Last resort: current directory
         return os.getcwd()
 
+    def invalidate_cwd(self, settings_key: str) -> None:
+        """Drop the cached working directory after a CWD/settings change."""
+        self._cwd_cache.pop(settings_key, None)
+
+    def prime_cwd(self, settings_key: str, path: str) -> None:
+        """Seed the CWD cache with a path already validated off the loop."""
+        self._cwd_cache[settings_key] = path
+
+    def _get_channel_routing_cached(self, settings_key: str):
+        """Get channel routing via a bounded per-key cache.
+
+        Invalidated by the handlers that mutate routing/settings; a cached
+        None means "no override configured" and is a valid entry.
+        """
+        cached = self._routing_cache.get(settings_key, _MISSING)
+        if cached is not _MISSING:
+            self._routing_cache.move_to_end(settings_key)
+            return cached
+        routing = self.settings_manager.get_channel_routing(settings_key)
+        self._routing_cache[settings_key] = routing
+        while len(self._routing_cache) > self.ROUTING_CACHE_CAP:
+            self._routing_cache.popitem(last=False)
+        return routing
+
+    def _invalidate_routing_cache(self, settings_key: Optional[str] = None) -> None:
+        """Drop cached routing for one settings key, or all when None."""
+        if settings_key is None:
+            self._routing_cache.clear()
+        else:
+            self._routing_cache.pop(settings_key, None)
+
+    def _should_capture_tb(self, bucket: str) -> bool:
+        """Allow a full traceback capture at most once per interval per bucket."""
+        now = time.monotonic()
+        last = self._last_traceback_log.get(bucket)
+        if last is not None and now - last < self.TRACEBACK_LOG_INTERVAL:
+            return False
+        self._last_traceback_log[bucket] = now
+        return True
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """Create a fire-and-forget task with a strong reference held."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
     def _get_settings_key(self, context: MessageContext) -> str:
         """Get settings key based on context"""
-        # Slack only in V2
-        return context.channel_id
+        # Slack only in V2; derived once in MessageContext.__post_init__
+        return context.settings_key
 
     def _get_target_context(self, context: MessageContext) -> MessageContext:
-        """Get target context for sending messages"""
-        if self.im_client.should_use_thread_for_reply() and context.thread_id:
-            return MessageContext(
-                user_id=context.user_id,
-                channel_id=context.channel_id,
-                thread_id=context.thread_id,
-                message_id=context.message_id,
-                platform_specific=context.platform_specific,
-            )
+        """Get target context for sending messages.
+
+        The thread-reply target carries exactly the same fields as the input
+        context, so no new MessageContext needs to be allocated either way.
+        """
         return context
 
     def _get_consolidated_message_key(self, context: MessageContext) -> str:
-        settings_key = self._get_settings_key(context)
-        thread_key = context.thread_id or context.channel_id
         # Include message_id to distinguish different conversation rounds within same thread
         # Each user message triggers a new round with its own consolidated message
-        trigger_id = context.message_id or ""
-        return f"{settings_key}:{thread_key}:{trigger_id}"
+        # str.join over a tuple avoids the per-placeholder format protocol of
+        # an f-string on this per-chunk path; the components are derived once
+        # on the context itself
+        return ":".join(
+            (context.settings_key, context.thread_key, context.trigger_key)
+        )
 
     def _get_consolidated_message_lock(self, key: str) -> asyncio.Lock:
-        if key not in self._consolidated_message_locks:
-            self._consolidated_message_locks[key] = asyncio.Lock()
-        return self._consolidated_message_locks[key]
+        return self._consolidated_lock_stripes[
+            hash(key) & (self.CONSOLIDATED_LOCK_STRIPES - 1)
+        ]
+
+    def _lru_put(self, store: "OrderedDict[str, str]", key: str, value: str) -> None:
+        """Insert into a bounded LRU store, evicting the oldest entry when full."""
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.CONSOLIDATED_STATE_CAP:
+            store.popitem(last=False)
+
+    def _store_consolidated_buffer(self, key: str, parts: list, byte_len: int) -> None:
+        """Store a buffer's parts and byte length, keeping both stores in sync."""
+        self._consolidated_message_buffers[key] = parts
+        self._consolidated_message_buffers.move_to_end(key)
+        self._consolidated_message_byte_lens[key] = byte_len
+        while len(self._consolidated_message_buffers) > self.CONSOLIDATED_STATE_CAP:
+            evicted, _ = self._consolidated_message_buffers.popitem(last=False)
+            self._consolidated_message_byte_lens.pop(evicted, None)
+            self._consolidated_flushed_parts.pop(evicted, None)
 
     async def clear_consolidated_message_id(
         self, context: MessageContext, trigger_message_id: Optional[str] = None
@@ -260,19 +490,34 @@ class Controller:
                                user's answer message, not original request)
         """
         # Build key with the original trigger message_id if provided
-        settings_key = self._get_settings_key(context)
-        thread_key = context.thread_id or context.channel_id
-        msg_id = (
-            trigger_message_id if trigger_message_id else (context.message_id or "")
+        key = ":".join(
+            (
+                context.settings_key,
+                context.thread_key,
+                trigger_message_id if trigger_message_id else context.trigger_key,
+            )
         )
-        key = f"{settings_key}:{thread_key}:{msg_id}"
 
-        # Use the same per-key lock as emit_agent_message to avoid race conditions
+        # Route through the worker when one is running so the clear is
+        # sequenced after any chunks already queued ahead of it.
+        queue = self._log_queues.get(key)
+        if queue is not None:
+            done = asyncio.Event()
+            queue.put_nowait(("clear", done))
+            await done.wait()
+            return
+        await self._clear_consolidated_state(key)
+
+    async def _clear_consolidated_state(self, key: str) -> None:
+        """Drop all stored state for one consolidated key."""
         lock = self._get_consolidated_message_lock(key)
         async with lock:
             self._consolidated_message_ids.pop(key, None)
             # Also clear the buffer so we don't append to stale content
             self._consolidated_message_buffers.pop(key, None)
+            self._consolidated_message_byte_lens.pop(key, None)
+            self._consolidated_dirty.discard(key)
+            self._consolidated_flushed_parts.pop(key, None)
 
     def _get_consolidated_max_bytes(self) -> int:
         # Slack API hard limit is exactly 4000 BYTES (not characters) for chat.update
@@ -304,42 +549,68 @@ class Controller:
     ):
         try:
             working_path = self.get_cwd(context)
-            stat_output, _ = await get_git_diff(working_path)
+            # create_full_diff_gist already runs git diff and returns the
+            # stat output; calling get_git_diff first ran the diff twice.
+            gist_url, stat_output, error = await create_full_diff_gist(working_path)
 
-            if not stat_output:
+            if not stat_output and not gist_url and not error:
                 return
 
-            from core.gist_service import create_full_diff_gist
-            from modules.im import InlineKeyboard, InlineButton
-
-            gist_url, _, error = await create_full_diff_gist(working_path)
             if error or not gist_url:
-                logger.warning(f"Failed to create gist for diff notification: {error}")
+                logger.warning("Failed to create gist for diff notification: %s", error)
                 return
 
             keyboard = InlineKeyboard(
-                buttons=[[InlineButton(text="📊 查看 Git 变更", url=gist_url)]]
+                buttons=[[InlineButton(text=_DIFF_NOTIFY_BUTTON_LABEL, url=gist_url)]]
             )
             await self.im_client.send_message_with_buttons(
-                target_context, "📝 *有代码变更*", keyboard
+                target_context, _DIFF_NOTIFY_TEXT, keyboard
             )
 
         except Exception as e:
-            logger.warning(f"Failed to send diff notification: {e}")
+            logger.warning("Failed to send diff notification: %s", e)
 
-    def _truncate_consolidated(self, text: str, max_bytes: int) -> str:
-        """Truncate text to fit within max_bytes (UTF-8 encoded)."""
-        if self._get_text_byte_length(text) <= max_bytes:
+    def _truncate_consolidated(
+        self, text: str, max_bytes: int, byte_len: Optional[int] = None
+    ) -> str:
+        """Truncate text to fit within max_bytes (UTF-8 encoded).
+
+        Pass ``byte_len`` when the caller already knows the encoded length to
+        avoid a redundant full-string encode.
+        """
+        if byte_len is None:
+            byte_len = self._get_text_byte_length(text)
+        if byte_len <= max_bytes:
             return text
         # Reserve space for ellipsis (3 bytes for "…")
         ellipsis = "…"
         ellipsis_bytes = len(ellipsis.encode("utf-8"))  # 3 bytes
         target_bytes = max_bytes - ellipsis_bytes
-        # Truncate bytes and decode, handling partial characters
-        encoded = text.encode("utf-8")
-        truncated = encoded[:target_bytes].decode("utf-8", errors="ignore")
+        truncated = self._truncate_by_utf8_bytes(text, target_bytes)
         return truncated.rstrip() + ellipsis
 
+    @staticmethod
+    def _truncate_by_utf8_bytes(text: str, max_bytes: int) -> str:
+        """Return the longest prefix of text that fits in max_bytes of UTF-8.
+
+        Walks codepoints with a running byte count instead of doing a full
+        encode/slice/decode round trip, so no whole-string copies are made.
+        """
+        total = 0
+        for i, ch in enumerate(text):
+            cp = ord(ch)
+            if cp < 0x80:
+                total += 1
+            elif cp < 0x800:
+                total += 2
+            elif cp < 0x10000:
+                total += 3
+            else:
+                total += 4
+            if total > max_bytes:
+                return text[:i]
+        return text
+
     def resolve_agent_for_context(self, context: MessageContext) -> str:
         """Unified agent resolution with dynamic override support.
 
@@ -351,15 +622,16 @@ class Controller:
         settings_key = self._get_settings_key(context)
 
         # Check dynamic override first
-        routing = self.settings_manager.get_channel_routing(settings_key)
+        routing = self._get_channel_routing_cached(settings_key)
         if routing and routing.agent_backend:
             # Verify the agent is registered
             if routing.agent_backend in self.agent_service.agents:
                 return routing.agent_backend
             else:
                 logger.warning(
-                    f"Channel routing specifies '{routing.agent_backend}' but agent is not registered, "
-                    f"falling back to static routing"
+                    "Channel routing specifies '%s' but agent is not registered, "
+                    "falling back to static routing",
+                    routing.agent_backend,
                 )
 
         # Fall back to static routing
@@ -377,7 +649,7 @@ class Controller:
             or (None, None, None) if no overrides.
         """
         settings_key = self._get_settings_key(context)
-        routing = self.settings_manager.get_channel_routing(settings_key)
+        routing = self._get_channel_routing_cached(settings_key)
         if routing:
             return (
                 routing.opencode_agent,
@@ -413,6 +685,8 @@ class Controller:
         settings_key = self._get_settings_key(context)
 
         if canonical_type == "notify":
+            # Push any buffered log content first so ordering is preserved
+            await self.flush_consolidated_message(context)
             target_context = self._get_target_context(context)
             await self.im_client.send_message(
                 target_context, text, parse_mode=parse_mode
@@ -420,6 +694,8 @@ class Controller:
             return
 
         if canonical_type == "result":
+            # Push any buffered log content first so ordering is preserved
+            await self.flush_consolidated_message(context)
             target_context = self._get_target_context(context)
             if len(text) <= self._get_result_max_chars():
                 await self.im_client.send_message(
@@ -431,9 +707,7 @@ class Controller:
                     target_context, summary, parse_mode=parse_mode
                 )
 
-                if self.config.platform == "slack" and hasattr(
-                    self.im_client, "upload_markdown"
-                ):
+                if self.config.platform == "slack" and self._cap_upload_markdown:
                     try:
                         await self.im_client.upload_markdown(
                             target_context,
@@ -442,7 +716,7 @@ class Controller:
                             filetype="markdown",
                         )
                     except Exception as err:
-                        logger.warning(f"Failed to upload result attachment: {err}")
+                        logger.warning("Failed to upload result attachment: %s", err)
                         await self.im_client.send_message(
                             target_context,
                             "无法上传附件（缺少 files:write 权限或上传失败）。需要我改成分条发送吗？",
@@ -453,7 +727,7 @@ class Controller:
             return
 
         # Log Messages: system/assistant/toolcall - consolidated into editable message
-        if canonical_type not in {"system", "assistant", "toolcall"}:
+        if canonical_type not in _LOG_TYPES:
             canonical_type = "assistant"
 
         if self.settings_manager.is_message_type_hidden(settings_key, canonical_type):
@@ -467,132 +741,344 @@ class Controller:
             return
 
         consolidated_key = self._get_consolidated_message_key(context)
+
+        # Producers only enqueue; the per-key worker owns all buffer state
+        # mutation, so the emit hot path never takes a lock.
+        queue = self._log_queues.get(consolidated_key)
+        if queue is None:
+            queue = asyncio.Queue()
+            self._log_queues[consolidated_key] = queue
+            self._spawn(self._log_worker_loop(context, consolidated_key, queue))
+        queue.put_nowait(("chunk", text.strip()))
+
+    async def _log_worker_loop(
+        self, context: MessageContext, key: str, queue: "asyncio.Queue"
+    ) -> None:
+        """Dedicated consumer for one conversation round's Log Messages.
+
+        Drains the key's queue in order: chunks are appended to the buffer,
+        and a debounce window coalesces bursts into single Slack edits.
+        Flush/clear requests carry an event so callers can await completion
+        with ordering preserved relative to queued chunks. The worker
+        retires itself after an idle period so finished rounds don't leak
+        tasks or queues.
+        """
+        dirty = False
+        dirty_since = 0.0
+        try:
+            while True:
+                if dirty:
+                    # Trailing-edge debounce, capped: a stream of chunks
+                    # spaced under the flush delay must not postpone the
+                    # edit forever, so force a flush once the buffer has
+                    # been dirty for the max coalesce age.
+                    age_left = self.CONSOLIDATED_MAX_COALESCE_AGE - (
+                        time.monotonic() - dirty_since
+                    )
+                    if age_left <= 0:
+                        await self._flush_consolidated(context, key)
+                        dirty = False
+                        continue
+                    timeout = min(self.CONSOLIDATED_FLUSH_DELAY, age_left)
+                else:
+                    timeout = self.LOG_WORKER_IDLE_TIMEOUT
+                try:
+                    kind, payload = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    if dirty:
+                        # Debounce window elapsed with no new chunks
+                        await self._flush_consolidated(context, key)
+                        dirty = False
+                        continue
+                    if queue.empty():
+                        # No awaits between the timeout and this pop, so a
+                        # producer either enqueued before it (queue is
+                        # non-empty) or will see the key gone and spawn a
+                        # fresh worker.
+                        self._log_queues.pop(key, None)
+                        return
+                    continue
+
+                if kind == "chunk":
+                    await self._append_consolidated_chunk(key, payload)
+                    if not dirty:
+                        dirty = True
+                        dirty_since = time.monotonic()
+                elif kind == "flush":
+                    await self._flush_consolidated(context, key)
+                    dirty = False
+                    payload.set()
+                else:  # "clear"
+                    await self._clear_consolidated_state(key)
+                    dirty = False
+                    payload.set()
+        finally:
+            if self._log_queues.get(key) is queue:
+                self._log_queues.pop(key, None)
+            # If the loop exited abnormally, unblock any waiters still queued
+            while not queue.empty():
+                kind, payload = queue.get_nowait()
+                if kind != "chunk":
+                    payload.set()
+
+    async def _append_consolidated_chunk(self, consolidated_key: str, chunk: str):
+        """Append one streamed chunk to the key's buffer and mark it dirty."""
         lock = self._get_consolidated_message_lock(consolidated_key)
+        async with lock:
+            parts = self._consolidated_message_buffers.get(consolidated_key)
+
+            # Buffers are lists of chunk/separator parts joined only at flush
+            # time, so streaming N chunks costs O(N) copies instead of O(N²).
+            # Byte lengths are tracked incrementally: only the new chunk is
+            # encoded on each streamed message.
+            chunk_bytes = self._get_text_byte_length(chunk)
+            if parts:
+                existing_bytes = self._consolidated_message_byte_lens.get(
+                    consolidated_key
+                )
+                if existing_bytes is None:
+                    existing_bytes = sum(map(self._get_text_byte_length, parts))
+                separator = "\n\n---\n\n"
+                parts.append(separator)
+                parts.append(chunk)
+                updated_bytes = existing_bytes + len(separator) + chunk_bytes
+            else:
+                parts = [chunk]
+                updated_bytes = chunk_bytes
+            self._store_consolidated_buffer(consolidated_key, parts, updated_bytes)
+            self._consolidated_dirty.add(consolidated_key)
+
+    async def flush_consolidated_message(
+        self, context: MessageContext, consolidated_key: Optional[str] = None
+    ):
+        """Flush any pending Log Message edit immediately.
+
+        Called before Result/Notify messages are sent so the final message
+        never overtakes buffered log content.
+        """
+        key = consolidated_key or self._get_consolidated_message_key(context)
+        queue = self._log_queues.get(key)
+        if queue is not None:
+            # The worker applies chunks queued ahead of the flush request
+            # first, preserving log-before-result ordering.
+            done = asyncio.Event()
+            queue.put_nowait(("flush", done))
+            await done.wait()
+            return
+        await self._flush_consolidated(context, key)
+
+    async def _flush_consolidated(self, context: MessageContext, key: str):
+        """Push the current buffer state to Slack (edit, split or send).
+
+        The buffer is snapshotted and re-pointed under the stripe lock, but
+        every Slack RPC runs with the lock released so a stripe-colliding
+        conversation is never blocked behind a network round trip. Chunks
+        appended while an edit is in flight land in the shared buffer and
+        re-mark the key dirty, so the next flush picks them up.
+        """
+        consolidated_key = key
+        lock = self._get_consolidated_message_lock(consolidated_key)
+
+        max_bytes = self._get_consolidated_max_bytes()
+        split_threshold = self._get_consolidated_split_threshold()
+        target_context = self._get_target_context(context)
+        continuation_notice = "\n\n---\n\n_(continued below...)_"
+        continuation_bytes = self._get_text_byte_length(continuation_notice)
+
+        finalize_old = None
 
         async with lock:
-            chunk = text.strip()
-            max_bytes = self._get_consolidated_max_bytes()
-            split_threshold = self._get_consolidated_split_threshold()
-            existing = self._consolidated_message_buffers.get(consolidated_key, "")
-            existing_message_id = self._consolidated_message_ids.get(consolidated_key)
+            if consolidated_key not in self._consolidated_dirty:
+                return
+            self._consolidated_dirty.discard(consolidated_key)
 
-            separator = "\n\n---\n\n" if existing else ""
-            updated = f"{existing}{separator}{chunk}" if existing else chunk
+            parts = self._consolidated_message_buffers.get(consolidated_key)
+            if not parts:
+                return
+            updated_bytes = self._consolidated_message_byte_lens.get(consolidated_key)
+            if updated_bytes is None:
+                updated_bytes = sum(map(self._get_text_byte_length, parts))
 
-            target_context = self._get_target_context(context)
-            continuation_notice = "\n\n---\n\n_(continued below...)_"
-            continuation_bytes = self._get_text_byte_length(continuation_notice)
+            existing_message_id = self._consolidated_message_ids.get(consolidated_key)
 
             # Case 1: Accumulated message exceeds threshold (in bytes), split off old message
+            flushed = self._consolidated_flushed_parts.get(consolidated_key, 0)
             if (
-                existing_message_id
-                and self._get_text_byte_length(updated) > split_threshold
+                updated_bytes > split_threshold
+                and existing_message_id
+                and 0 < flushed < len(parts)
             ):
-                old_text = existing + continuation_notice
-                old_text = self._truncate_consolidated(old_text, max_bytes)
-
-                try:
-                    await self.im_client.edit_message(
-                        target_context,
-                        existing_message_id,
-                        text=old_text,
-                        parse_mode="markdown",
-                    )
-                except Exception as err:
-                    logger.warning(f"Failed to finalize old Log Message: {err}")
+                # Finalize the portion already shown in the old message (the
+                # edit itself happens after the lock is released) and
+                # continue with the parts that arrived since the last flush
+                old_text = "".join(parts[:flushed]) + continuation_notice
+                finalize_old = (
+                    existing_message_id,
+                    self._truncate_consolidated(old_text, max_bytes),
+                )
 
-                # Start fresh with just the new chunk
-                self._consolidated_message_buffers[consolidated_key] = chunk
+                # Start fresh with the not-yet-shown parts
+                parts = parts[flushed:]
+                if parts and parts[0] == "\n\n---\n\n":
+                    parts = parts[1:]
+                updated_bytes = sum(map(self._get_text_byte_length, parts))
+                self._store_consolidated_buffer(
+                    consolidated_key, parts, updated_bytes
+                )
                 self._consolidated_message_ids.pop(consolidated_key, None)
-                updated = chunk
+                self._consolidated_flushed_parts.pop(consolidated_key, None)
                 existing_message_id = None
                 logger.info(
                     "Log Message exceeded %d bytes, starting new message",
                     split_threshold,
                 )
 
-            # Case 2: Single chunk (including first message) exceeds max_bytes
-            # Split into multiple messages to avoid truncation
-            while self._get_text_byte_length(updated) > max_bytes:
-                # Find split point that fits within threshold (accounting for continuation notice)
-                target_bytes = split_threshold - continuation_bytes
-                first_part = self._truncate_consolidated(updated, target_bytes)
-                first_part = (
-                    first_part.rstrip("…") + continuation_notice
-                )  # Replace truncation marker
-
-                send_ok = False
-                if existing_message_id:
-                    try:
-                        await self.im_client.edit_message(
-                            target_context,
-                            existing_message_id,
-                            text=first_part,
-                            parse_mode="markdown",
-                        )
-                        send_ok = True
-                    except Exception as err:
-                        logger.warning(f"Failed to edit oversized Log Message: {err}")
-                else:
-                    try:
-                        await self.im_client.send_message(
-                            target_context, first_part, parse_mode="markdown"
-                        )
-                        send_ok = True
-                    except Exception as err:
-                        logger.error(f"Failed to send oversized Log Message: {err}")
+            # How many buffer parts this flush renders; in-flight appends
+            # extend the same stored list past this point.
+            rendered_parts = len(parts)
+            # Mid-chunk splitting needs the materialized string.
+            updated = "".join(parts) if updated_bytes > max_bytes else None
 
-                if not send_ok:
-                    # Failed to send/edit - stop splitting and truncate the remainder
-                    logger.warning(
-                        "Stopping split loop due to send failure, truncating remainder"
-                    )
-                    break
+        # --- network I/O below runs without the lock held ---
 
-                # Continue with remainder (skip the part we already sent)
-                # Don't lstrip() - preserve intentional indentation in code blocks
-                sent_chars = len(first_part) - len(continuation_notice)
-                updated = updated[sent_chars:]
-                # Clear both local var and stored ID to avoid editing old message on failure
-                existing_message_id = None
-                self._consolidated_message_ids.pop(consolidated_key, None)
-                logger.info(
-                    "Log Message chunk exceeded %d bytes, split and continuing",
-                    max_bytes,
+        if finalize_old is not None:
+            old_id, old_text = finalize_old
+            try:
+                await self.im_client.edit_message(
+                    target_context,
+                    old_id,
+                    text=old_text,
+                    parse_mode="markdown",
                 )
+            except Exception as err:
+                logger.warning("Failed to finalize old Log Message: %s", err)
+
+        # Case 2: Single chunk (including first message) exceeds max_bytes
+        # Split into multiple messages to avoid truncation. The loop only
+        # touches locals plus single atomic dict pops, so it needs no lock.
+        collapsed = updated is not None
+        while updated_bytes > max_bytes:
+            # Find split point that fits within threshold (accounting for continuation notice)
+            target_bytes = split_threshold - continuation_bytes
+            first_part = self._truncate_consolidated(
+                updated, target_bytes, byte_len=updated_bytes
+            )
+            first_part = (
+                first_part.rstrip("…") + continuation_notice
+            )  # Replace truncation marker
 
-            updated = self._truncate_consolidated(updated, max_bytes)
-            self._consolidated_message_buffers[consolidated_key] = updated
-
+            send_ok = False
             if existing_message_id:
                 try:
-                    ok = await self.im_client.edit_message(
+                    await self.im_client.edit_message(
                         target_context,
                         existing_message_id,
-                        text=updated,
+                        text=first_part,
                         parse_mode="markdown",
                     )
+                    send_ok = True
                 except Exception as err:
-                    logger.warning(f"Failed to edit Log Message: {err}")
-                    ok = False
-                if ok:
-                    return
+                    logger.warning("Failed to edit oversized Log Message: %s", err)
+            else:
+                try:
+                    await self.im_client.send_message(
+                        target_context, first_part, parse_mode="markdown"
+                    )
+                    send_ok = True
+                except Exception as err:
+                    logger.error("Failed to send oversized Log Message: %s", err)
+
+            if not send_ok:
+                # Failed to send/edit - stop splitting and truncate the remainder
+                logger.warning(
+                    "Stopping split loop due to send failure, truncating remainder"
+                )
+                break
+
+            # Continue with remainder (skip the part we already sent)
+            # Don't lstrip() - preserve intentional indentation in code blocks
+            sent_chars = len(first_part) - len(continuation_notice)
+            updated = updated[sent_chars:]
+            updated_bytes = self._get_text_byte_length(updated)
+            # Clear both local var and stored ID to avoid editing old message on failure
+            existing_message_id = None
+            self._consolidated_message_ids.pop(consolidated_key, None)
+            logger.info(
+                "Log Message chunk exceeded %d bytes, split and continuing",
+                max_bytes,
+            )
+
+        if collapsed:
+            # The split loop collapsed the buffer into a single part
+            if updated_bytes > max_bytes:
+                updated = self._truncate_consolidated(
+                    updated, max_bytes, byte_len=updated_bytes
+                )
+                updated_bytes = self._get_text_byte_length(updated)
+        else:
+            # Join once at flush time
+            updated = parts[0] if len(parts) == 1 else "".join(parts)
+
+        shown_id = None
+        if existing_message_id:
+            try:
+                ok = await self.im_client.edit_message(
+                    target_context,
+                    existing_message_id,
+                    text=updated,
+                    parse_mode="markdown",
+                )
+            except Exception as err:
+                logger.warning("Failed to edit Log Message: %s", err)
+                ok = False
+            if ok:
+                shown_id = existing_message_id
+            else:
                 self._consolidated_message_ids.pop(consolidated_key, None)
 
+        if shown_id is None:
             try:
-                new_id = await self.im_client.send_message(
+                shown_id = await self.im_client.send_message(
                     target_context, updated, parse_mode="markdown"
                 )
-                self._consolidated_message_ids[consolidated_key] = new_id
             except Exception as err:
-                logger.error(f"Failed to send Log Message: {err}", exc_info=True)
+                logger.error(
+                    "Failed to send Log Message: %r",
+                    err,
+                    exc_info=self._should_capture_tb("log_send_error"),
+                )
+
+        # Brief re-acquire to record what the Slack message now shows,
+        # merging with any chunks that streamed in during the awaits above.
+        async with lock:
+            if collapsed:
+                # The split loop replaced the rendered parts with a single
+                # remainder part; keep any parts appended mid-flight.
+                stored = self._consolidated_message_buffers.get(consolidated_key)
+                tail = (
+                    stored[rendered_parts:]
+                    if stored is not None and len(stored) > rendered_parts
+                    else []
+                )
+                new_parts = [updated, *tail]
+                new_bytes = updated_bytes + sum(
+                    map(self._get_text_byte_length, tail)
+                )
+                self._store_consolidated_buffer(
+                    consolidated_key, new_parts, new_bytes
+                )
+                rendered_parts = 1
+            if shown_id is not None:
+                self._lru_put(
+                    self._consolidated_message_ids, consolidated_key, shown_id
+                )
+                self._consolidated_flushed_parts[consolidated_key] = rendered_parts
 
     async def send_processing_message_with_stop_button(
         self,
         context: MessageContext,
         text: str = "⏳ Processing...",
     ) -> Optional[str]:
-        from modules.im.base import InlineKeyboard, InlineButton
 
         target_context = self._get_target_context(context)
         keyboard = InlineKeyboard(
@@ -600,13 +1086,13 @@ class Controller:
         )
 
         try:
-            if hasattr(self.im_client, "send_message_with_buttons"):
+            if self._cap_send_with_buttons:
                 message_id = await self.im_client.send_message_with_buttons(
                     target_context, text, keyboard, parse_mode="markdown"
                 )
                 return message_id
         except Exception as err:
-            logger.warning(f"Failed to send processing message with stop button: {err}")
+            logger.warning("Failed to send processing message with stop button: %s", err)
 
         return None
 
@@ -618,14 +1104,14 @@ class Controller:
     ) -> bool:
         target_context = self._get_target_context(context)
         try:
-            if hasattr(self.im_client, "delete_message"):
+            if self._cap_delete_message:
                 return await self.im_client.delete_message(target_context, message_id)
-            elif hasattr(self.im_client, "remove_inline_keyboard"):
+            elif self._cap_remove_kbd:
                 return await self.im_client.remove_inline_keyboard(
                     target_context, message_id, text=new_text, parse_mode="markdown"
                 )
         except Exception as err:
-            logger.debug(f"Failed to remove stop button: {err}")
+            logger.debug("Failed to remove stop button: %s", err)
         return False
 
     # Settings update handler (for Slack modal)
@@ -637,6 +1123,12 @@ class Controller:
         require_mention: Optional[bool] = None,
     ):
         """Handle settings update (typically from Slack modal)"""
+        # One context serves both the confirmation and error paths
+        context = MessageContext(
+            user_id=user_id,
+            channel_id=channel_id if channel_id else user_id,
+            platform_specific={},
+        )
         try:
             # Determine settings key - for Slack, always use channel_id
             if self.config.platform == "slack":
@@ -646,26 +1138,22 @@ class Controller:
             else:
                 settings_key = channel_id if channel_id else user_id
 
-            # Update settings
-            user_settings = self.settings_manager.get_user_settings(settings_key)
-            user_settings.show_message_types = show_message_types
+            # Update settings; batch so both writes land in one save
+            with self.settings_manager.batch_update():
+                user_settings = self.settings_manager.get_user_settings(settings_key)
+                user_settings.show_message_types = show_message_types
+                self.settings_manager.update_user_settings(settings_key, user_settings)
+                self.settings_manager.set_require_mention(settings_key, require_mention)
 
-            # Save settings - using the correct method name
-            self.settings_manager.update_user_settings(settings_key, user_settings)
-
-            # Save require_mention setting
-            self.settings_manager.set_require_mention(settings_key, require_mention)
+            # Settings changed; drop any cached CWD/routing state for this key
+            self.invalidate_cwd(settings_key)
+            self._invalidate_routing_cache(settings_key)
 
             logger.info(
-                f"Updated settings for {settings_key}: show types = {show_message_types}, "
-                f"require_mention = {require_mention}"
-            )
-
-            # Create context for sending confirmation (without 'message' field)
-            context = MessageContext(
-                user_id=user_id,
-                channel_id=channel_id if channel_id else user_id,
-                platform_specific={},
+                "Updated settings for %s: show types = %s, require_mention = %s",
+                settings_key,
+                show_message_types,
+                require_mention,
             )
 
             # Send confirmation
@@ -674,13 +1162,7 @@ class Controller:
             )
 
         except Exception as e:
-            logger.error(f"Error updating settings: {e}")
-            # Create context for error message (without 'message' field)
-            context = MessageContext(
-                user_id=user_id,
-                channel_id=channel_id if channel_id else user_id,
-                platform_specific={},
-            )
+            logger.error("Error updating settings: %s", e)
             await self.im_client.send_message(
                 context, f"❌ Failed to update settings: {str(e)}"
             )
@@ -690,25 +1172,19 @@ class Controller:
         self, user_id: str, new_cwd: str, channel_id: Optional[str] = None
     ):
         """Handle working directory change submission (from Slack modal) - reuse command handler logic"""
+        # Create context for messages (without 'message' field which doesn't
+        # exist in MessageContext); shared by the success and error paths
+        context = MessageContext(
+            user_id=user_id,
+            channel_id=channel_id if channel_id else user_id,
+            platform_specific={},
+        )
         try:
-            # Create context for messages (without 'message' field which doesn't exist in MessageContext)
-            context = MessageContext(
-                user_id=user_id,
-                channel_id=channel_id if channel_id else user_id,
-                platform_specific={},
-            )
-
             # Reuse the same logic from handle_set_cwd command handler
             await self.command_handler.handle_set_cwd(context, new_cwd.strip())
 
         except Exception as e:
-            logger.error(f"Error changing working directory: {e}")
-            # Create context for error message (without 'message' field)
-            context = MessageContext(
-                user_id=user_id,
-                channel_id=channel_id if channel_id else user_id,
-                platform_specific={},
-            )
+            logger.error("Error changing working directory: %s", e)
             await self.im_client.send_message(
                 context, f"❌ Failed to change working directory: {str(e)}"
             )
@@ -720,13 +1196,50 @@ class Controller:
         view: dict,
         action: dict,
     ) -> None:
-        """Handle routing modal updates when selections change."""
+        """Handle routing modal updates when selections change.
+
+        Slack sends a block_actions payload for every dropdown change, so
+        rapid toggles are debounced per view: each new change cancels the
+        pending rebuild and only the latest selections trigger the
+        expensive OpenCode fetch + views.update.
+        """
+        view_id = view.get("id")
+        view_hash = view.get("hash")
+        if not view_id or not view_hash:
+            logger.warning("Routing modal update missing view id/hash")
+            return
+        prior = self._modal_debounce.pop(view_id, None)
+        if prior is not None:
+            prior.cancel()
+        self._modal_debounce[view_id] = self._spawn(
+            self._debounced_routing_modal_update(user_id, channel_id, view, action)
+        )
+
+    async def _debounced_routing_modal_update(
+        self,
+        user_id: str,
+        channel_id: str,
+        view: dict,
+        action: dict,
+    ) -> None:
+        """Wait out the debounce window, then rebuild the routing modal."""
+        # Cancellation during the sleep means a newer update superseded this
+        # one; the canceller already removed our entry from the dict.
+        await asyncio.sleep(self.MODAL_DEBOUNCE_DELAY)
+        self._modal_debounce.pop(view.get("id"), None)
+        await self._do_routing_modal_update(user_id, channel_id, view, action)
+
+    async def _do_routing_modal_update(
+        self,
+        user_id: str,
+        channel_id: str,
+        view: dict,
+        action: dict,
+    ) -> None:
+        """Rebuild and push the routing modal from the latest view state."""
         try:
             view_id = view.get("id")
             view_hash = view.get("hash")
-            if not view_id or not view_hash:
-                logger.warning("Routing modal update missing view id/hash")
-                return
 
             resolved_channel_id = channel_id if channel_id else user_id
             context = MessageContext(
@@ -737,35 +1250,39 @@ class Controller:
 
             settings_key = self._get_settings_key(context)
             current_routing = self.settings_manager.get_channel_routing(settings_key)
-            all_backends = list(self.agent_service.agents.keys())
-            registered_backends = sorted(
-                all_backends, key=lambda x: (x != "opencode", x)
-            )
+            registered_backends = self._get_registered_backends()
             current_backend = self.resolve_agent_for_context(context)
 
-            values = view.get("state", {}).get("values", {})
-            backend_data = values.get("backend_block", {}).get("backend_select", {})
-            selected_backend = backend_data.get("selected_option", {}).get("value")
+            values = _deep_get(view, "state", "values") or {}
+            selected_backend = _deep_get(
+                values, "backend_block", "backend_select", "selected_option", "value"
+            )
             if not selected_backend:
                 selected_backend = current_backend
 
             def _selected_value(block_id: str, action_id: str) -> Optional[str]:
-                data = values.get(block_id, {}).get(action_id, {})
-                return data.get("selected_option", {}).get("value")
+                return _deep_get(
+                    values, block_id, action_id, "selected_option", "value"
+                )
 
             def _selected_prefixed_value(
                 block_id: str, action_prefix: str
             ) -> Optional[str]:
-                block = values.get(block_id, {})
+                block = values.get(block_id)
                 if not isinstance(block, dict):
                     return None
+                # Fast path: the action_id usually equals the prefix exactly
+                value = _deep_get(block, action_prefix, "selected_option", "value")
+                if value is not None:
+                    return value
+                # Fallback: suffixed action ids (e.g. cache-busting variants)
                 for action_id, action_data in block.items():
                     if (
                         isinstance(action_id, str)
                         and action_id.startswith(action_prefix)
                         and isinstance(action_data, dict)
                     ):
-                        return action_data.get("selected_option", {}).get("value")
+                        return _deep_get(action_data, "selected_option", "value")
                 return None
 
             oc_agent = _selected_value("opencode_agent_block", "opencode_agent_select")
@@ -803,21 +1320,26 @@ class Controller:
             opencode_default_config = {}
 
             if "opencode" in registered_backends:
-                try:
-                    opencode_agent = self.agent_service.agents.get("opencode")
-                    if opencode_agent and hasattr(opencode_agent, "_get_server"):
-                        server = await opencode_agent._get_server()  # type: ignore[attr-defined]
-                        await server.ensure_running()
-                        cwd = self.get_cwd(context)
-                        opencode_agents = await server.get_available_agents(cwd)
-                        opencode_models = await server.get_available_models(cwd)
-                        opencode_default_config = await server.get_default_config(cwd)
-                except Exception as e:
-                    logger.warning(f"Failed to fetch OpenCode data: {e}")
-
-            if hasattr(self.im_client, "update_routing_modal"):
+                (
+                    opencode_agents,
+                    opencode_models,
+                    opencode_default_config,
+                ) = await self._fetch_opencode_data(context)
+
+            if self._im_update_routing_modal is not None:
                 current_env_vars = self._get_opencode_env_vars()
-                await self.im_client.update_routing_modal(  # type: ignore[attr-defined]
+                state_hash = hash(
+                    (
+                        selected_backend,
+                        oc_agent,
+                        oc_model,
+                        oc_reasoning,
+                        tuple(sorted(current_env_vars.items())),
+                    )
+                )
+                if self._last_modal_state.get(view_id) == state_hash:
+                    return
+                await self._im_update_routing_modal(
                     view_id=view_id,
                     view_hash=view_hash,
                     channel_id=resolved_channel_id,
@@ -833,8 +1355,15 @@ class Controller:
                     selected_opencode_reasoning=oc_reasoning,
                     current_env_vars=current_env_vars,
                 )
+                # Record only after views.update succeeds; marking earlier
+                # would make a failed update (e.g. Slack hash conflict)
+                # suppress the retry with the same selections.
+                # Views are short-lived; a coarse cap keeps the map bounded
+                if len(self._last_modal_state) > 512:
+                    self._last_modal_state.clear()
+                self._last_modal_state[view_id] = state_hash
         except Exception as e:
-            logger.error(f"Error updating routing modal: {e}", exc_info=True)
+            logger.error("Error updating routing modal: %s", e, exc_info=True)
 
     async def handle_routing_update(
         self,
@@ -850,8 +1379,12 @@ class Controller:
         claude_model: Optional[str] = None,
         claude_env_vars: Optional[Dict[str, str]] = None,
     ):
-        from modules.settings_manager import ChannelRouting
 
+        context = MessageContext(
+            user_id=user_id,
+            channel_id=channel_id if channel_id else user_id,
+            platform_specific={},
+        )
         try:
             routing = ChannelRouting(
                 agent_backend=backend,
@@ -865,95 +1398,219 @@ class Controller:
 
             settings_key = channel_id if channel_id else user_id
 
-            self.settings_manager.set_channel_routing(settings_key, routing)
-            self.settings_manager.set_require_mention(settings_key, require_mention)
+            # Batch both updates into a single settings save
+            with self.settings_manager.batch_update():
+                self.settings_manager.set_channel_routing(settings_key, routing)
+                self.settings_manager.set_require_mention(settings_key, require_mention)
+            self._invalidate_routing_cache(settings_key)
 
             env_vars_changed = False
             if env_vars is not None:
                 env_vars_changed = await self._update_opencode_env_vars(env_vars)
 
-            parts = [f"Backend: **{backend}**"]
+            # Collect (label, value) pairs and format in one pass; falsy
+            # values are dropped by the join below.
+            pairs = [("Backend", backend)]
             if backend == "opencode":
-                if opencode_agent:
-                    parts.append(f"Agent: **{opencode_agent}**")
-                if opencode_model:
-                    parts.append(f"Model: **{opencode_model}**")
-                if opencode_reasoning_effort:
-                    parts.append(f"Reasoning Effort: **{opencode_reasoning_effort}**")
-                if env_vars:
-                    parts.append(f"Env Vars: **{len(env_vars)} configured**")
+                pairs += [
+                    ("Agent", opencode_agent),
+                    ("Model", opencode_model),
+                    ("Reasoning Effort", opencode_reasoning_effort),
+                    ("Env Vars", f"{len(env_vars)} configured" if env_vars else None),
+                ]
             elif backend == "claude":
-                if claude_model:
-                    parts.append(f"Model: **{claude_model}**")
-                if claude_mode:
-                    parts.append(f"Mode: **{claude_mode}**")
-                if claude_env_vars:
-                    parts.append(f"Env Vars: **{len(claude_env_vars)} configured**")
+                pairs += [
+                    ("Model", claude_model),
+                    ("Mode", claude_mode),
+                    (
+                        "Env Vars",
+                        f"{len(claude_env_vars)} configured"
+                        if claude_env_vars
+                        else None,
+                    ),
+                ]
 
             if require_mention is None:
-                parts.append("Require @mention: **(Default)**")
-            elif require_mention:
-                parts.append("Require @mention: **Yes**")
+                mention = "(Default)"
             else:
-                parts.append("Require @mention: **No**")
+                mention = "Yes" if require_mention else "No"
+            pairs.append(("Require @mention", mention))
 
-            # Create context for confirmation message
-            context = MessageContext(
-                user_id=user_id,
-                channel_id=channel_id if channel_id else user_id,
-                platform_specific={},
-            )
+            summary = "\n".join(f"{k}: **{v}**" for k, v in pairs if v)
 
             await self.im_client.send_message(
                 context,
-                f"✅ Agent routing updated!\n" + "\n".join(parts),
+                "✅ Agent routing updated!\n" + summary,
                 parse_mode="markdown",
             )
 
             logger.info(
-                f"Routing updated for {settings_key}: backend={backend}, "
-                f"agent={opencode_agent}, model={opencode_model}, require_mention={require_mention}"
+                "Routing updated for %s: backend=%s, agent=%s, model=%s, "
+                "require_mention=%s",
+                settings_key,
+                backend,
+                opencode_agent,
+                opencode_model,
+                require_mention,
             )
 
         except Exception as e:
-            logger.error(f"Error updating routing: {e}")
-            context = MessageContext(
-                user_id=user_id,
-                channel_id=channel_id if channel_id else user_id,
-                platform_specific={},
-            )
+            logger.error("Error updating routing: %s", e)
             await self.im_client.send_message(
                 context, f"❌ Failed to update routing: {str(e)}"
             )
 
-    async def _update_opencode_env_vars(self, env_vars: Dict[str, str]) -> bool:
-        from config.v2_config import V2Config
-        from modules.agents.opencode.server import OpenCodeServerManager
+    def _get_home_selected_channel(self, user_id: str) -> Optional[str]:
+        """Read a user's remembered App Home channel, refreshing LRU order."""
+        channel_id = self._home_selected_channels.get(user_id)
+        if channel_id is not None:
+            self._home_selected_channels.move_to_end(user_id)
+        return channel_id
+
+    def _set_home_selected_channel(self, user_id: str, channel_id: str) -> None:
+        """Remember a user's App Home channel, evicting the oldest past cap."""
+        self._home_selected_channels[user_id] = channel_id
+        self._home_selected_channels.move_to_end(user_id)
+        while len(self._home_selected_channels) > self.HOME_SELECTED_CAP:
+            self._home_selected_channels.popitem(last=False)
+
+    def _get_registered_backends(self) -> list:
+        """Sorted backend names (opencode first), cached per registry version."""
+        version = self.agent_service.registry_version
+        if version != self._registered_backends_ver:
+            self._registered_backends_cache = sorted(
+                self.agent_service.agents.keys(), key=lambda x: (x != "opencode", x)
+            )
+            self._registered_backends_ver = version
+        return self._registered_backends_cache
+
+    async def _fetch_opencode_data(self, context: MessageContext):
+        """Fetch OpenCode agents, models and default config for the context's cwd.
+
+        Concurrent callers for the same cwd await one shared in-flight fetch
+        instead of issuing their own round-trips, and a short TTL cache
+        absorbs keystroke-driven bursts of modal updates. Returns a
+        ``(agents, models, default_config)`` tuple; empty values on failure.
+        """
+        opencode_agent = self.agent_service.agents.get("opencode")
+        if not (opencode_agent and hasattr(opencode_agent, "_get_server")):
+            return [], {}, {}
+        cwd = self.get_cwd(context)
+
+        cached = self._opencode_data_cache.get(cwd)
+        if cached is not None:
+            fetched_at, result = cached
+            if time.monotonic() - fetched_at < self.OPENCODE_DATA_TTL:
+                return result
+
+        inflight = self._opencode_data_inflight.get(cwd)
+        if inflight is not None:
+            return await inflight
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._opencode_data_inflight[cwd] = future
+        result = ([], {}, {})
+        try:
+            server = await opencode_agent._get_server()  # type: ignore[attr-defined]
+            await server.ensure_running()
+            # The three RPCs are independent; overlap them so the wall time
+            # is the slowest round trip instead of the sum of all three.
+            opencode_agents, opencode_models, opencode_default_config = (
+                await asyncio.gather(
+                    server.get_available_agents(cwd),
+                    server.get_available_models(cwd),
+                    server.get_default_config(cwd),
+                    return_exceptions=True,
+                )
+            )
+            if isinstance(opencode_agents, BaseException):
+                logger.warning(
+                    "Failed to fetch OpenCode agents: %s", opencode_agents
+                )
+                opencode_agents = []
+            if isinstance(opencode_models, BaseException):
+                logger.warning(
+                    "Failed to fetch OpenCode models: %s", opencode_models
+                )
+                opencode_models = {}
+            if isinstance(opencode_default_config, BaseException):
+                logger.warning(
+                    "Failed to fetch OpenCode default config: %s",
+                    opencode_default_config,
+                )
+                opencode_default_config = {}
+            result = (opencode_agents, opencode_models, opencode_default_config)
+            self._opencode_data_cache[cwd] = (time.monotonic(), result)
+        except Exception as e:
+            logger.warning("Failed to fetch OpenCode data: %s", e)
+            result = ([], {}, {})
+        finally:
+            self._opencode_data_inflight.pop(cwd, None)
+            # Resolve inside finally so a BaseException (cancellation) can
+            # never strand waiters on a forever-pending shared future.
+            if not future.done():
+                future.set_result(result)
+        return result
+
+    def _load_v2config_cached(self):
+        """Load V2Config, reusing the parsed object while the file is unchanged.
+
+        Modal updates and App Home refreshes read the config on every Slack
+        interaction; an mtime check turns those into in-memory lookups.
+        """
+
+        try:
+            mtime = os.stat(paths.get_config_path()).st_mtime_ns
+        except OSError:
+            mtime = None
+        if (
+            self._v2config_cache is not None
+            and mtime is not None
+            and mtime == self._v2config_mtime
+        ):
+            return self._v2config_cache
+        config = V2Config.load()
+        self._v2config_cache = config
+        self._v2config_mtime = mtime
+        return config
 
+    async def _update_opencode_env_vars(self, env_vars: Dict[str, str]) -> bool:
         try:
-            config = V2Config.load()
+            # Fast path: saving the same vars again shouldn't touch disk
+            if (
+                self._cached_opencode_env_vars is not None
+                and self._cached_opencode_env_vars == env_vars
+            ):
+                return False
+
+            config = self._load_v2config_cached()
             current_env_vars = config.agents.opencode.env_vars or {}
 
             if current_env_vars == env_vars:
                 return False
 
             config.agents.opencode.env_vars = env_vars
+            self._cached_opencode_env_vars = dict(env_vars)
             config.save()
-            logger.info(f"Updated OpenCode env_vars: {list(env_vars.keys())}")
+            # The cached object already reflects the save; refresh the
+            # recorded mtime instead of re-reading the file.
+            try:
+                self._v2config_mtime = os.stat(paths.get_config_path()).st_mtime_ns
+            except OSError:
+                self._v2config_cache = None
+            logger.info("Updated OpenCode env_vars: %s", list(env_vars.keys()))
 
             if OpenCodeServerManager._instance:
                 await OpenCodeServerManager._instance.update_env_vars(env_vars)
 
             return True
         except Exception as e:
-            logger.error(f"Failed to update OpenCode env_vars: {e}")
+            logger.error("Failed to update OpenCode env_vars: %s", e)
             return False
 
     def _get_opencode_env_vars(self) -> Dict[str, str]:
-        from config.v2_config import V2Config
-
         try:
-            config = V2Config.load()
+            config = self._load_v2config_cached()
             return config.agents.opencode.env_vars or {}
         except Exception:
             return {}
@@ -962,23 +1619,20 @@ class Controller:
         self, user_id: str, selected_channel_id: Optional[str] = None
     ):
         try:
-            all_backends = list(self.agent_service.agents.keys())
-            registered_backends = sorted(
-                all_backends, key=lambda x: (x != "opencode", x)
-            )
+            registered_backends = self._get_registered_backends()
 
             channels = []
-            if hasattr(self.im_client, "get_bot_channels"):
-                channels = await self.im_client.get_bot_channels()
+            if self._im_get_bot_channels is not None:
+                channels = await self._im_get_bot_channels()
 
             if not selected_channel_id:
-                selected_channel_id = self._home_selected_channels.get(user_id)
+                selected_channel_id = self._get_home_selected_channel(user_id)
 
             if not selected_channel_id and channels:
                 selected_channel_id = channels[0]["id"]
 
             if selected_channel_id:
-                self._home_selected_channels[user_id] = selected_channel_id
+                self._set_home_selected_channel(user_id, selected_channel_id)
 
             if selected_channel_id:
                 context = MessageContext(
@@ -1000,25 +1654,19 @@ class Controller:
             opencode_default_config = {}
 
             if "opencode" in registered_backends:
-                try:
-                    opencode_agent = self.agent_service.agents.get("opencode")
-                    if opencode_agent and hasattr(opencode_agent, "_get_server"):
-                        server = await opencode_agent._get_server()
-                        await server.ensure_running()
-                        cwd = self.get_cwd(context)
-                        opencode_agents = await server.get_available_agents(cwd)
-                        opencode_models = await server.get_available_models(cwd)
-                        opencode_default_config = await server.get_default_config(cwd)
-                except Exception as e:
-                    logger.warning(f"Failed to fetch OpenCode data for App Home: {e}")
+                (
+                    opencode_agents,
+                    opencode_models,
+                    opencode_default_config,
+                ) = await self._fetch_opencode_data(context)
 
             current_env_vars = self._get_opencode_env_vars()
             claude_env_vars = (
                 current_routing.claude_env_vars if current_routing else None
             )
 
-            if hasattr(self.im_client, "publish_app_home"):
-                await self.im_client.publish_app_home(
+            if self._im_publish_app_home is not None:
+                await self._im_publish_app_home(
                     user_id=user_id,
                     registered_backends=registered_backends,
                     current_backend=current_backend,
@@ -1032,40 +1680,52 @@ class Controller:
                     selected_channel_id=selected_channel_id,
                 )
         except Exception as e:
-            logger.error(f"Error handling app_home_opened: {e}", exc_info=True)
+            logger.error("Error handling app_home_opened: %s", e, exc_info=True)
 
     async def handle_home_setting_change(
         self, user_id: str, action_id: str, value: str
     ):
-        from modules.settings_manager import ChannelRouting
 
         try:
-            selected_channel_id = self._home_selected_channels.get(user_id)
+            selected_channel_id = self._get_home_selected_channel(user_id)
             settings_key = selected_channel_id if selected_channel_id else user_id
-            current_routing = self.settings_manager.get_channel_routing(settings_key)
-
-            if current_routing is None:
-                current_routing = ChannelRouting()
 
             if value == "__default__":
                 value = None
 
-            if action_id == "home_backend_select":
-                current_routing.agent_backend = value
-            elif action_id == "home_opencode_agent_select":
-                current_routing.opencode_agent = value
-            elif action_id == "home_opencode_model_select":
-                current_routing.opencode_model = value
-            elif action_id == "home_opencode_reasoning_select":
-                current_routing.opencode_reasoning_effort = value
-            elif action_id == "home_claude_mode_select":
-                current_routing.claude_mode = value
-            elif action_id == "home_claude_model_select":
-                current_routing.claude_model = value
-
-            self.settings_manager.set_channel_routing(settings_key, current_routing)
+            # Serialize the read-modify-write per key so two rapid dropdown
+            # changes can't clobber each other; the lock is released before
+            # the (slow) App Home re-render below.
+            async with self._routing_locks[settings_key]:
+                current_routing = self.settings_manager.get_channel_routing(
+                    settings_key
+                )
+
+                if current_routing is None:
+                    current_routing = ChannelRouting()
+
+                if action_id == "home_backend_select":
+                    current_routing.agent_backend = value
+                elif action_id == "home_opencode_agent_select":
+                    current_routing.opencode_agent = value
+                elif action_id == "home_opencode_model_select":
+                    current_routing.opencode_model = value
+                elif action_id == "home_opencode_reasoning_select":
+                    current_routing.opencode_reasoning_effort = value
+                elif action_id == "home_claude_mode_select":
+                    current_routing.claude_mode = value
+                elif action_id == "home_claude_model_select":
+                    current_routing.claude_model = value
+
+                self.settings_manager.set_channel_routing(
+                    settings_key, current_routing
+                )
+                self._invalidate_routing_cache(settings_key)
             logger.info(
-                f"App Home setting changed: {action_id}={value} for channel {settings_key}"
+                "App Home setting changed: %s=%s for channel %s",
+                action_id,
+                value,
+                settings_key,
             )
 
             await self.handle_app_home_opened(
@@ -1073,14 +1733,14 @@ class Controller:
             )
 
         except Exception as e:
-            logger.error(f"Error handling home setting change: {e}", exc_info=True)
+            logger.error("Error handling home setting change: %s", e, exc_info=True)
 
     async def handle_home_channel_select(self, user_id: str, channel_id: str):
         try:
-            self._home_selected_channels[user_id] = channel_id
+            self._set_home_selected_channel(user_id, channel_id)
             await self.handle_app_home_opened(user_id, selected_channel_id=channel_id)
         except Exception as e:
-            logger.error(f"Error handling home channel select: {e}", exc_info=True)
+            logger.error("Error handling home channel select: %s", e, exc_info=True)
 
     async def handle_home_edit_env(self, user_id: str, action_id: str, trigger_id: str):
         """Handle Edit button click for environment variables in App Home."""
@@ -1098,30 +1758,29 @@ class Controller:
                     current_routing.claude_env_vars if current_routing else None
                 ) or {}
             else:
-                logger.warning(f"Unknown env edit action: {action_id}")
+                logger.warning("Unknown env edit action: %s", action_id)
                 return
 
-            if hasattr(self.im_client, "open_env_vars_modal"):
-                await self.im_client.open_env_vars_modal(
+            if self._im_open_env_vars_modal is not None:
+                await self._im_open_env_vars_modal(
                     trigger_id=trigger_id,
                     user_id=user_id,
                     env_type=env_type,
                     current_env_vars=current_env_vars,
                 )
         except Exception as e:
-            logger.error(f"Error handling home edit env: {e}", exc_info=True)
+            logger.error("Error handling home edit env: %s", e, exc_info=True)
 
     async def handle_home_env_save(
         self, user_id: str, env_type: str, env_vars: Dict[str, str]
     ):
         """Handle saving environment variables from App Home modal."""
-        from modules.settings_manager import ChannelRouting
 
         try:
             if env_type == "opencode":
                 await self._update_opencode_env_vars(env_vars)
                 logger.info(
-                    f"Updated OpenCode env vars from App Home for user {user_id}"
+                    "Updated OpenCode env vars from App Home for user %s", user_id
                 )
             elif env_type == "claude":
                 settings_key = user_id
@@ -1132,17 +1791,19 @@ class Controller:
                     current_routing = ChannelRouting()
                 current_routing.claude_env_vars = env_vars
                 self.settings_manager.set_channel_routing(settings_key, current_routing)
-                logger.info(f"Updated Claude env vars from App Home for user {user_id}")
+                self._invalidate_routing_cache(settings_key)
+                logger.info("Updated Claude env vars from App Home for user %s", user_id)
 
             await self.handle_app_home_opened(user_id)
 
         except Exception as e:
-            logger.error(f"Error handling home env save: {e}", exc_info=True)
+            logger.error("Error handling home env save: %s", e, exc_info=True)
 
     def run(self):
         """Run the controller"""
         logger.info(
-            f"Starting Claude Proxy Controller with {self.config.platform} platform..."
+            "Starting Claude Proxy Controller with %s platform...",
+            self.config.platform,
         )
 
         # 不再创建额外事件循环，避免与 IM 客户端的内部事件循环冲突
@@ -1155,7 +1816,7 @@ class Controller:
         except KeyboardInterrupt:
             logger.info("Received keyboard interrupt, shutting down...")
         except Exception as e:
-            logger.error(f"Error in main run loop: {e}", exc_info=True)
+            logger.error("Error in main run loop: %s", e, exc_info=True)
         finally:
             # Best-effort 同步清理，避免跨事件循环 await
             self.cleanup_sync()
@@ -1173,43 +1834,47 @@ class Controller:
         try:
             self.update_checker.stop()
         except Exception as e:
-            logger.debug(f"Update checker cleanup skipped: {e}")
+            logger.debug("Update checker cleanup skipped: %s", e)
 
-        # Cancel receiver tasks without awaiting (they may belong to other loops)
+        # Cancel receiver tasks without awaiting (they may belong to other
+        # loops): detach the whole registry first, then cancel the batch, so
+        # shutdown never leaves a half-cleared dict behind.
         try:
-            for session_id, task in list(self.receiver_tasks.items()):
+            tasks = list(self.receiver_tasks.values())
+            self.receiver_tasks.clear()
+            for task in tasks:
                 if not task.done():
                     task.cancel()
-                # Remove from registry regardless
-                del self.receiver_tasks[session_id]
         except Exception as e:
-            logger.debug(f"Receiver tasks cleanup skipped due to: {e}")
+            logger.debug("Receiver tasks cleanup skipped due to: %s", e)
 
         # Do not attempt to await SessionHandler cleanup here to avoid cross-loop issues.
         # Active connections will be closed by process exit; mappings are persisted separately.
 
         # Attempt to call stop if it's a plain function; skip if coroutine to avoid cross-loop awaits
         try:
-            stop_attr = getattr(self.im_client, "stop", None)
-            if callable(stop_attr):
-                import inspect
-
-                if not inspect.iscoroutinefunction(stop_attr):
-                    stop_attr()
+            if callable(self._im_stop) and not self._im_stop_is_coro:
+                self._im_stop()
         except Exception as e:
             logger.warning("Failed to stop IM client: %s", e)
 
         # Best-effort async shutdown for IM clients
         try:
-            shutdown_attr = getattr(self.im_client, "shutdown", None)
+            shutdown_attr = self._im_shutdown
             if callable(shutdown_attr):
-                import inspect
-
-                if inspect.iscoroutinefunction(shutdown_attr):
-                    try:
-                        asyncio.run(shutdown_attr())
-                    except RuntimeError:
-                        pass
+                if self._im_shutdown_is_coro:
+                    loop = self._im_loop
+                    if loop is not None and loop.is_running():
+                        # Run on the client's own loop so the shutdown sees
+                        # its resources instead of a throwaway loop.
+                        asyncio.run_coroutine_threadsafe(
+                            shutdown_attr(), loop
+                        ).result(timeout=5)
+                    else:
+                        try:
+                            asyncio.run(shutdown_attr())
+                        except RuntimeError:
+                            pass
                 else:
                     shutdown_attr()
         except Exception as e:
@@ -1217,10 +1882,9 @@ class Controller:
 
         # Stop OpenCode server if running
         try:
-            from modules.agents.opencode import OpenCodeServerManager
 
             OpenCodeServerManager.stop_instance_sync()
         except Exception as e:
-            logger.debug(f"OpenCode server cleanup skipped: {e}")
+            logger.debug("OpenCode server cleanup skipped: %s", e)
 
         logger.info("Controller cleanup (sync) complete")
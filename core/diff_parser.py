@@ -2,12 +2,34 @@
 Diff parser and formatter for Slack-friendly display.
 """
 
+import functools
+import io
 import re
 from dataclasses import dataclass, field
 from typing import List, Optional
 
 from modules.i18n import t
 
+# Compiled once at import; parse_unified_diff matches these per line and the
+# re-module cache lookup is measurable on diffs tens of thousands of lines long.
+_DIFF_GIT_RE = re.compile(r"diff --git a/(.*) b/(.*)")
+_HUNK_RE = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# File-metadata dispatch: first 4 chars -> (FileDiff attr, full prefix).
+# One dict probe replaces a cascade of startswith calls; the full prefix
+# is only verified on the rare lines that hit the table.
+_FILE_FLAG = {
+    "new ": ("is_new_file", "new file mode"),
+    "dele": ("is_deleted_file", "deleted file mode"),
+    "Bina": ("is_binary", "Binary files"),
+}
+
+
+# Change-kind byte codes stored in DiffHunk.kinds
+_PLUS = ord("+")
+_MINUS = ord("-")
+_SPACE = ord(" ")
+
 
 @dataclass
 class DiffHunk:
@@ -17,7 +39,16 @@ class DiffHunk:
     old_count: int
     new_start: int
     new_count: int
-    changes: List[tuple] = field(default_factory=list)
+    # Struct-of-arrays change storage: one kind byte ('+'/'-'/' ') plus one
+    # content string per line. Cheaper than a list of 2-tuples and lets the
+    # formatters compare a plain int per change.
+    kinds: bytearray = field(default_factory=bytearray)
+    contents: List[str] = field(default_factory=list)
+
+    @property
+    def changes(self) -> List[tuple]:
+        """Compatibility view of the changes as (kind, content) tuples."""
+        return [(chr(k), c) for k, c in zip(self.kinds, self.contents)]
 
 
 @dataclass
@@ -32,8 +63,13 @@ class FileDiff:
     is_binary: bool = False
 
 
+@functools.lru_cache(maxsize=4)
 def parse_unified_diff(diff_output: str) -> List[FileDiff]:
-    """Parse unified diff output into structured FileDiff objects."""
+    """Parse unified diff output into structured FileDiff objects.
+
+    Results are memoized on the raw diff text (e.g. reopening the diff modal
+    on an unchanged worktree); callers must treat them as read-only.
+    """
     if not diff_output or not diff_output.strip():
         return []
 
@@ -41,19 +77,31 @@ def parse_unified_diff(diff_output: str) -> List[FileDiff]:
     current_file: Optional[FileDiff] = None
     current_hunk: Optional[DiffHunk] = None
 
-    lines = diff_output.split("\n")
-    i = 0
-
-    while i < len(lines):
-        line = lines[i]
+    # Walk the buffer with find/slice instead of split("\n"): no list of
+    # every line and no up-front allocation of lines we merely skip.
+    pos = 0
+    end = len(diff_output)
 
-        if line.startswith("diff --git"):
+    while pos < end:
+        nl = diff_output.find("\n", pos)
+        if nl == -1:
+            line = diff_output[pos:]
+            pos = end
+        else:
+            line = diff_output[pos:nl]
+            pos = nl + 1
+        # Dispatch on the first character so each line runs exactly one
+        # classification; the full startswith/regex checks only execute on
+        # the handful of lines that can actually match them.
+        c0 = line[:1]
+
+        if c0 == "d" and line.startswith("diff --git"):
             if current_file is not None:
                 if current_hunk is not None:
                     current_file.hunks.append(current_hunk)
                 files.append(current_file)
 
-            match = re.match(r"diff --git a/(.*) b/(.*)", line)
+            match = _DIFF_GIT_RE.match(line)
             if match:
                 current_file = FileDiff(
                     old_path=match.group(1), new_path=match.group(2)
@@ -61,25 +109,16 @@ def parse_unified_diff(diff_output: str) -> List[FileDiff]:
             else:
                 current_file = FileDiff(old_path="unknown", new_path="unknown")
             current_hunk = None
-            i += 1
             continue
 
-        if current_file is not None:
-            if line.startswith("new file mode"):
-                current_file.is_new_file = True
-                i += 1
-                continue
-            if line.startswith("deleted file mode"):
-                current_file.is_deleted_file = True
-                i += 1
-                continue
-            if line.startswith("Binary files"):
-                current_file.is_binary = True
-                i += 1
+        if current_file is not None and (c0 == "n" or c0 == "d" or c0 == "B"):
+            flag = _FILE_FLAG.get(line[:4])
+            if flag is not None and line.startswith(flag[1]):
+                setattr(current_file, flag[0], True)
                 continue
 
         # @@ -old_start,old_count +new_start,new_count @@
-        hunk_match = re.match(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@", line)
+        hunk_match = _HUNK_RE.match(line) if c0 == "@" else None
         if hunk_match and current_file is not None:
             if current_hunk is not None:
                 current_file.hunks.append(current_hunk)
@@ -89,20 +128,23 @@ def parse_unified_diff(diff_output: str) -> List[FileDiff]:
                 old_count=int(hunk_match.group(2) or 1),
                 new_start=int(hunk_match.group(3)),
                 new_count=int(hunk_match.group(4) or 1),
-                changes=[],
             )
-            i += 1
             continue
 
         if current_hunk is not None:
-            if line.startswith("+") and not line.startswith("+++"):
-                current_hunk.changes.append(("+", line[1:]))
-            elif line.startswith("-") and not line.startswith("---"):
-                current_hunk.changes.append(("-", line[1:]))
-            elif line.startswith(" "):
-                current_hunk.changes.append((" ", line[1:]))
-
-        i += 1
+            # c0 already classified the line; one extra slice compare
+            # rejects the +++/--- file headers.
+            if c0 == "+":
+                if line[:3] != "+++":
+                    current_hunk.kinds.append(_PLUS)
+                    current_hunk.contents.append(line[1:])
+            elif c0 == "-":
+                if line[:3] != "---":
+                    current_hunk.kinds.append(_MINUS)
+                    current_hunk.contents.append(line[1:])
+            elif c0 == " ":
+                current_hunk.kinds.append(_SPACE)
+                current_hunk.contents.append(line[1:])
 
     if current_file is not None:
         if current_hunk is not None:
@@ -121,8 +163,15 @@ def _truncate_line(line: str, max_length: int) -> str:
     return line
 
 
+def _write_part(buf: io.StringIO, part: str) -> None:
+    """Append one output line to the buffer, newline-separated like join."""
+    if buf.tell():
+        buf.write("\n")
+    buf.write(part)
+
+
 def _output_paired_changes(
-    output_parts: List[str],
+    buf: io.StringIO,
     deletions: List[str],
     additions: List[str],
     changes_shown: int,
@@ -135,9 +184,9 @@ def _output_paired_changes(
             break
 
         if j < len(deletions):
-            output_parts.append(f"  ➖ `{_truncate_line(deletions[j], 60)}`")
+            _write_part(buf, f"  ➖ `{_truncate_line(deletions[j], 60)}`")
         if j < len(additions):
-            output_parts.append(f"  ➕ `{_truncate_line(additions[j], 60)}`")
+            _write_part(buf, f"  ➕ `{_truncate_line(additions[j], 60)}`")
 
         changes_shown += 1
 
@@ -151,13 +200,14 @@ def format_diff_for_slack(
     if not files:
         return t("diff.no_changes")
 
-    output_parts = []
+    # C-level growable buffer instead of list + final join re-copy.
+    buf = io.StringIO()
     files_shown = 0
 
     for file_diff in files:
         if files_shown >= max_files:
             remaining = len(files) - max_files
-            output_parts.append(f"\n_... 还有 {remaining} 个文件未显示_")
+            _write_part(buf, f"\n_... 还有 {remaining} 个文件未显示_")
             break
 
         files_shown += 1
@@ -171,12 +221,18 @@ def format_diff_for_slack(
         else:
             icon, status = "📄", ""
 
-        output_parts.append(f"\n{icon} *{file_diff.new_path}* {status}")
+        _write_part(buf, f"\n{icon} *{file_diff.new_path}* {status}")
 
         if file_diff.is_binary:
-            output_parts.append(f"  _{t('diff.binary_changed')}_")
+            _write_part(buf, f"  _{t('diff.binary_changed')}_")
             continue
 
+        # Exact total via C-level bytearray counts; this frees the emission
+        # loop below to bail out mid-hunk as soon as the cap is reached.
+        total_changes = 0
+        for hunk in file_diff.hunks:
+            total_changes += len(hunk.kinds) - hunk.kinds.count(_SPACE)
+
         changes_shown = 0
         for hunk in file_diff.hunks:
             if changes_shown >= max_changes_per_file:
@@ -185,48 +241,49 @@ def format_diff_for_slack(
             deletions = []
             additions = []
 
-            for change_type, content in hunk.changes:
-                if change_type == "-":
+            for kind, content in zip(hunk.kinds, hunk.contents):
+                if kind == _MINUS:
                     if additions:
                         changes_shown = _output_paired_changes(
-                            output_parts,
+                            buf,
                             deletions,
                             additions,
                             changes_shown,
                             max_changes_per_file,
                         )
                         deletions, additions = [], []
+                        if changes_shown >= max_changes_per_file:
+                            break
                     deletions.append(content)
-                elif change_type == "+":
+                elif kind == _PLUS:
                     additions.append(content)
                 else:
                     if deletions or additions:
                         changes_shown = _output_paired_changes(
-                            output_parts,
+                            buf,
                             deletions,
                             additions,
                             changes_shown,
                             max_changes_per_file,
                         )
                         deletions, additions = [], []
+                        if changes_shown >= max_changes_per_file:
+                            break
 
             if deletions or additions:
                 changes_shown = _output_paired_changes(
-                    output_parts,
+                    buf,
                     deletions,
                     additions,
                     changes_shown,
                     max_changes_per_file,
                 )
 
-        total_changes = sum(
-            len([c for c in h.changes if c[0] != " "]) for h in file_diff.hunks
-        )
         if total_changes > max_changes_per_file:
             remaining = total_changes - max_changes_per_file
-            output_parts.append(f"  _... 还有 {remaining} 处变更未显示_")
+            _write_part(buf, f"  _... 还有 {remaining} 处变更未显示_")
 
-    return "\n".join(output_parts)
+    return buf.getvalue()
 
 
 def format_diff_summary(files: List[FileDiff]) -> str:
@@ -237,13 +294,12 @@ def format_diff_summary(files: List[FileDiff]) -> str:
     total_insertions = 0
     total_deletions = 0
 
+    # bytearray.count runs the O(total-changes) tally in C; the interpreted
+    # loop only steps once per hunk.
     for file_diff in files:
         for hunk in file_diff.hunks:
-            for change_type, _ in hunk.changes:
-                if change_type == "+":
-                    total_insertions += 1
-                elif change_type == "-":
-                    total_deletions += 1
+            total_insertions += hunk.kinds.count(_PLUS)
+            total_deletions += hunk.kinds.count(_MINUS)
 
     parts = [t("diff.files_changed", count=len(files))]
     if total_insertions > 0:
@@ -320,6 +376,12 @@ def format_diff_as_rich_text_blocks(
             )
             continue
 
+        # Exact total via C-level bytearray counts; the emission loop below
+        # can then bail out mid-hunk as soon as the cap is reached.
+        total_changes = 0
+        for hunk in file_diff.hunks:
+            total_changes += len(hunk.kinds) - hunk.kinds.count(_SPACE)
+
         rich_text_elements = []
         changes_shown = 0
 
@@ -330,8 +392,8 @@ def format_diff_as_rich_text_blocks(
             deletions = []
             additions = []
 
-            for change_type, content in hunk.changes:
-                if change_type == "-":
+            for kind, content in zip(hunk.kinds, hunk.contents):
+                if kind == _MINUS:
                     if additions:
                         changes_shown = _add_rich_text_changes(
                             rich_text_elements,
@@ -341,8 +403,10 @@ def format_diff_as_rich_text_blocks(
                             max_changes_per_file,
                         )
                         deletions, additions = [], []
+                        if changes_shown >= max_changes_per_file:
+                            break
                     deletions.append(content)
-                elif change_type == "+":
+                elif kind == _PLUS:
                     additions.append(content)
                 else:
                     if deletions or additions:
@@ -354,6 +418,8 @@ def format_diff_as_rich_text_blocks(
                             max_changes_per_file,
                         )
                         deletions, additions = [], []
+                        if changes_shown >= max_changes_per_file:
+                            break
 
             if deletions or additions:
                 changes_shown = _add_rich_text_changes(
@@ -367,9 +433,6 @@ def format_diff_as_rich_text_blocks(
         if rich_text_elements:
             blocks.append({"type": "rich_text", "elements": rich_text_elements})
 
-        total_changes = sum(
-            len([c for c in h.changes if c[0] != " "]) for h in file_diff.hunks
-        )
         if total_changes > max_changes_per_file:
             remaining = total_changes - max_changes_per_file
             blocks.append(
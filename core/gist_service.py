@@ -3,49 +3,223 @@ Git diff and Gist service for sharing code changes.
 """
 
 import asyncio
+import hashlib
+import json
 import logging
-import tempfile
-import os
+import shutil
+import time
+from collections import OrderedDict
 from typing import Optional, Tuple, Dict, List
-from datetime import datetime
+
+import aiohttp
 
 logger = logging.getLogger(__name__)
 
+# Resolved once at import: lets gist creation fail fast when gh is absent
+# instead of paying a doomed exec attempt, and passing the absolute path to
+# the subprocess skips the PATH walk.
+_GH_PATH = shutil.which("gh")
+
+# Refuse uploads this large up front; GitHub rejects them anyway, and piping
+# a doomed payload wastes the whole transfer first.
+MAX_GIST_DIFF_BYTES = 10 * 1024 * 1024
+
+# Recently uploaded diffs, fingerprint -> gist URL; retries of an identical
+# diff reuse the existing gist instead of re-uploading it.
+_GIST_CACHE: "OrderedDict[bytes, str]" = OrderedDict()
+_GIST_CACHE_CAP = 64
+
 
-async def get_git_diff(working_path: str) -> Tuple[str, str]:
+def _diff_fingerprint(diff_output: str) -> bytes:
+    """Content hash of the whole diff; cheap next to the upload it guards."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(diff_output.encode("utf-8", errors="replace"))
+    return h.digest()
+
+
+def _split_patch_with_stat(output: str) -> Tuple[str, str]:
+    """Split 'git diff --patch-with-stat' output into (stat, patch).
+
+    The patch body starts at the first "diff --git" line; everything
+    before it is the stat section. Either side may be empty (clean tree,
+    or a patch with no stat block).
+    """
+    if output.startswith("diff --git"):
+        split_at = 0
+    else:
+        split_at = output.find("\ndiff --git ")
+        split_at = split_at + 1 if split_at != -1 else len(output)
+    return output[:split_at].strip(), output[split_at:]
+
+
+async def get_git_diff(
+    working_path: str, max_bytes: Optional[int] = None
+) -> Tuple[str, str, bool]:
     """
     Get git diff output from the working directory.
 
+    When max_bytes is set and the output exceeds it, git is killed early
+    instead of letting it finish rendering a patch nobody can use.
+
     Returns:
-        Tuple of (stat_output, diff_output)
+        Tuple of (stat_output, diff_output, truncated)
     """
     try:
-        stat_process = await asyncio.create_subprocess_exec(
+        # One invocation produces the diffstat block followed by the patch;
+        # a second 'git diff --stat' would fork again and re-walk the tree.
+        process = await asyncio.create_subprocess_exec(
             "git",
             "diff",
-            "--stat",
+            "--patch-with-stat",
             cwd=working_path,
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
+            # stderr was piped and then discarded; DEVNULL skips the pipe
+            # allocation and cannot stall a chatty git on a full buffer.
+            stderr=asyncio.subprocess.DEVNULL,
         )
-        stat_stdout, _ = await stat_process.communicate()
-        stat_output = stat_stdout.decode("utf-8", errors="replace").strip()
+        # Stream stdout into one growable buffer instead of communicate(),
+        # which accumulates a chunk list and re-joins it at the end.
+        buf = bytearray()
+        truncated = False
+        while True:
+            chunk = await process.stdout.read(1 << 20)
+            if not chunk:
+                break
+            buf.extend(chunk)
+            if max_bytes is not None and len(buf) > max_bytes:
+                # Past the cap the caller refuses the diff anyway; stop
+                # reading and kill git rather than draining the rest.
+                truncated = True
+                process.kill()
+                break
+        await process.wait()
+        output = buf.decode("utf-8", errors="replace")
+        stat_output, diff_output = _split_patch_with_stat(output)
+
+        return stat_output, diff_output, truncated
 
-        diff_process = await asyncio.create_subprocess_exec(
-            "git",
-            "diff",
-            cwd=working_path,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
+    except Exception as e:
+        logger.error(f"Error getting git diff: {e}", exc_info=True)
+        return "", "", False
+
+
+# One-shot gh warm-up task; the module-level reference keeps it alive.
+_gh_warm_task = None
+
+
+def _ensure_gh_warm() -> None:
+    """Prime the gh binary and its auth state once, off the critical path.
+
+    Loads the binary into page cache and refreshes any stale token while
+    git is busy computing the diff, so the later gist upload does not pay
+    that cost serially.
+    """
+    global _gh_warm_task
+    if _gh_warm_task is None:
+        _gh_warm_task = asyncio.ensure_future(_warm_gh())
+
+
+async def _warm_gh() -> None:
+    if _GH_PATH is None:
+        return
+    try:
+        process = await asyncio.create_subprocess_exec(
+            _GH_PATH,
+            "auth",
+            "status",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
         )
-        diff_stdout, _ = await diff_process.communicate()
-        diff_output = diff_stdout.decode("utf-8", errors="replace")
+        await process.wait()
+    except Exception:
+        pass
 
-        return stat_output, diff_output
 
-    except Exception as e:
-        logger.error(f"Error getting git diff: {e}", exc_info=True)
-        return "", ""
+_GIST_API_URL = "https://api.github.com/gists"
+
+# Token resolved lazily via 'gh auth token': None = not yet asked,
+# "" = unavailable (upload falls back to the gh subprocess).
+_gh_token: Optional[str] = None
+
+# Shared keep-alive session for direct API calls; lives for the process.
+_http_session_obj: Optional[aiohttp.ClientSession] = None
+
+
+async def _get_gh_token() -> str:
+    global _gh_token
+    if _gh_token is None:
+        token = ""
+        if _GH_PATH is not None:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    _GH_PATH,
+                    "auth",
+                    "token",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+                stdout, _ = await process.communicate()
+                if process.returncode == 0:
+                    token = stdout.decode("utf-8", errors="replace").strip()
+            except Exception as e:
+                logger.warning(f"Could not resolve gh auth token: {e}")
+        _gh_token = token
+    return _gh_token
+
+
+def _http_session() -> aiohttp.ClientSession:
+    global _http_session_obj
+    if _http_session_obj is None or _http_session_obj.closed:
+        _http_session_obj = aiohttp.ClientSession()
+    return _http_session_obj
+
+
+async def _post_gist_via_http(
+    body: dict, token: str
+) -> Tuple[Optional[str], Optional[str]]:
+    """POST the gist payload straight to the GitHub API."""
+    async with _http_session().post(
+        _GIST_API_URL,
+        json=body,
+        headers={
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github+json",
+        },
+    ) as resp:
+        if resp.status != 201:
+            error_msg = (await resp.text())[:200]
+            logger.error(f"Failed to create gist (HTTP {resp.status}): {error_msg}")
+            return None, error_msg
+        data = await resp.json()
+        return data["html_url"], None
+
+
+async def _post_gist_via_gh(body: dict) -> Tuple[Optional[str], Optional[str]]:
+    """POST the gist payload through the gh CLI (uses gh's stored auth)."""
+    process = await asyncio.create_subprocess_exec(
+        _GH_PATH,
+        "api",
+        "gists",
+        "--method",
+        "POST",
+        "--input",
+        "-",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate(input=json.dumps(body).encode("utf-8"))
+
+    if process.returncode != 0:
+        error_msg = stderr.decode("utf-8", errors="replace").strip()
+        logger.error(f"Failed to create gist: {error_msg}")
+        return None, error_msg
+
+    try:
+        return json.loads(stdout)["html_url"], None
+    except (ValueError, KeyError, TypeError):
+        logger.error(f"Unexpected gh api response: {stdout[:200]!r}")
+        return None, "Unexpected gh api response"
 
 
 def _parse_diff_to_files(diff_output: str) -> Dict[str, str]:
@@ -79,48 +253,65 @@ async def create_diff_gist(
     working_path: str,
     description: Optional[str] = None,
 ) -> Tuple[Optional[str], Optional[str]]:
-    if not diff_output or not diff_output.strip():
+    # isspace stops at the first real character; strip() would copy and
+    # scan the whole (potentially multi-MB) diff just to test emptiness.
+    if not diff_output or diff_output.isspace():
         return None, "No diff content"
 
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    project_name = os.path.basename(working_path) if working_path else "unknown"
+    if _GH_PATH is None:
+        return None, "gh CLI not found"
+
+    if len(diff_output) > MAX_GIST_DIFF_BYTES:
+        logger.warning(f"Diff too large for gist: {len(diff_output)} chars")
+        return None, "Diff too large to upload"
+
+    cache_key = _diff_fingerprint(diff_output)
+    cached_url = _GIST_CACHE.get(cache_key)
+    if cached_url is not None:
+        _GIST_CACHE.move_to_end(cache_key)
+        logger.info(f"Reusing gist for identical diff: {cached_url}")
+        return cached_url, None
 
     if not description:
+        # time.strftime formats straight from the C struct tm; no
+        # intermediate datetime object per call.
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        project_name = (
+            working_path.rpartition("/")[2] if working_path else ""
+        ) or "unknown"
         description = f"Changes in {project_name} at {timestamp}"
 
-    temp_dir = None
-    temp_files: List[str] = []
-
     try:
         files_dict = _parse_diff_to_files(diff_output)
         if not files_dict:
             return None, "No files to diff"
 
-        temp_dir = tempfile.mkdtemp(prefix=f"{project_name}-{timestamp}-")
-
-        for file_path, file_diff in files_dict.items():
-            safe_name = _sanitize_filename(file_path)
-            temp_path = os.path.join(temp_dir, safe_name)
-            with open(temp_path, "w") as f:
-                f.write(file_diff)
-            temp_files.append(temp_path)
-
-        cmd = ["gh", "gist", "create"] + temp_files + ["-d", description]
-
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        stdout, stderr = await process.communicate()
-
-        if process.returncode != 0:
-            error_msg = stderr.decode("utf-8", errors="replace").strip()
-            logger.error(f"Failed to create gist: {error_msg}")
-            return None, error_msg
-
-        gist_url = stdout.decode("utf-8", errors="replace").strip()
-        logger.info(f"Created gist with {len(temp_files)} file(s): {gist_url}")
+        # POST the gist in one request with the diffs straight from memory;
+        # no temp files, no per-file syscalls, no cleanup pass.
+        body = {
+            "description": description,
+            "public": False,
+            "files": {
+                _sanitize_filename(file_path): {"content": file_diff}
+                for file_path, file_diff in files_dict.items()
+            },
+        }
+
+        # Direct HTTPS via the cached token skips the gh fork/exec and Go
+        # runtime start entirely; without a token, go through the CLI.
+        token = await _get_gh_token()
+        if token:
+            gist_url, error = await _post_gist_via_http(body, token)
+        else:
+            gist_url, error = await _post_gist_via_gh(body)
+        if error or not gist_url:
+            return None, error
+
+        _GIST_CACHE[cache_key] = gist_url
+        if len(_GIST_CACHE) > _GIST_CACHE_CAP:
+            _GIST_CACHE.popitem(last=False)
+
+        logger.info(f"Created gist with {len(body['files'])} file(s): {gist_url}")
         return gist_url, None
 
     except FileNotFoundError:
@@ -128,26 +319,40 @@ async def create_diff_gist(
     except Exception as e:
         logger.error(f"Error creating gist: {e}", exc_info=True)
         return None, str(e)
-    finally:
-        for f in temp_files:
-            try:
-                os.unlink(f)
-            except Exception:
-                pass
-        if temp_dir:
-            try:
-                os.rmdir(temp_dir)
-            except Exception:
-                pass
 
 
 async def create_full_diff_gist(
     working_path: str,
     description: Optional[str] = None,
 ) -> Tuple[Optional[str], str, Optional[str]]:
-    stat_output, diff_output = await get_git_diff(working_path)
+    _ensure_gh_warm()
 
-    if not diff_output.strip():
+    # Fast path: 'git diff --quiet' only reports an exit code, skipping
+    # patch and stat generation entirely when the worktree is clean.
+    try:
+        quiet_process = await asyncio.create_subprocess_exec(
+            "git",
+            "diff",
+            "--quiet",
+            cwd=working_path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        if await quiet_process.wait() == 0:
+            return None, "", None
+    except Exception as e:
+        logger.warning(f"git diff --quiet check failed: {e}")
+
+    # The stat block streams first, so it survives intact even when the
+    # patch body blows past the upload cap and git gets killed early.
+    stat_output, diff_output, truncated = await get_git_diff(
+        working_path, max_bytes=MAX_GIST_DIFF_BYTES
+    )
+    if truncated:
+        logger.warning("Diff exceeds gist size cap; skipping upload")
+        return None, stat_output, "Diff too large to upload"
+
+    if not diff_output or diff_output.isspace():
         return None, "", None
 
     gist_url, error = await create_diff_gist(diff_output, working_path, description)
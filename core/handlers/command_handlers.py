@@ -1,9 +1,12 @@
 """Command handlers for bot commands like /start, /clear, /cwd, etc."""
 
 import asyncio
+import functools
 import os
 import logging
-from typing import Optional
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
 from modules.agents import AgentRequest, get_agent_display_name
 from modules.im import MessageContext, InlineKeyboard, InlineButton
 from modules.i18n import t
@@ -11,6 +14,147 @@ from modules.i18n import t
 logger = logging.getLogger(__name__)
 
 
+# Recent .git checks per working path; a directory does not turn into or
+# stop being a repo between consecutive commands, so the stat can be
+# skipped for a short while.
+_GIT_REPO_CACHE: Dict[str, Tuple[float, bool]] = {}
+_GIT_REPO_TTL = 30.0
+
+
+def _is_git_repo(path: str) -> bool:
+    """Check for a .git directory, caching the answer for a short TTL."""
+    now = time.monotonic()
+    entry = _GIT_REPO_CACHE.get(path)
+    if entry is not None and now - entry[0] < _GIT_REPO_TTL:
+        return entry[1]
+    is_repo = os.path.isdir(os.path.join(path, ".git"))
+    _GIT_REPO_CACHE[path] = (now, is_repo)
+    return is_repo
+
+
+def _resolve_cwd(new_path: str, formatter) -> Tuple[str, Optional[str]]:
+    """Expand, create if missing, and validate a working directory.
+
+    Does blocking filesystem work, so callers should run it via
+    asyncio.to_thread. Returns (absolute_path, error_text); error_text
+    is None when the path is usable.
+    """
+    expanded_path = os.path.expanduser(new_path)
+    absolute_path = os.path.abspath(expanded_path)
+
+    if not os.path.exists(absolute_path):
+        try:
+            os.makedirs(absolute_path, exist_ok=True)
+            logger.info(f"Created directory: {absolute_path}")
+        except Exception as e:
+            return absolute_path, t("errors.cannot_create_dir", error=str(e))
+
+    if not os.path.isdir(absolute_path):
+        return absolute_path, t(
+            "errors.path_not_directory",
+            path=formatter.format_code_inline(absolute_path),
+        )
+
+    return absolute_path, None
+
+
+@functools.lru_cache(maxsize=1)
+def _slack_welcome_keyboard() -> InlineKeyboard:
+    """Welcome panel keyboard; labels and callbacks are fixed per process."""
+    return InlineKeyboard(
+        buttons=[
+            [
+                InlineButton(
+                    text=t("buttons.resume_session"), callback_data="cmd_resume"
+                ),
+                InlineButton(text=t("buttons.git_diff"), callback_data="cmd_diff"),
+            ],
+            [
+                InlineButton(text=t("buttons.current_dir"), callback_data="cmd_cwd"),
+                InlineButton(
+                    text=t("buttons.change_dir"), callback_data="cmd_change_cwd"
+                ),
+            ],
+            [
+                InlineButton(
+                    text=t("buttons.agent_settings"), callback_data="cmd_routing"
+                ),
+                InlineButton(text=t("buttons.settings"), callback_data="cmd_settings"),
+            ],
+        ]
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _slack_welcome_template() -> str:
+    """Welcome text with {name}/{agent}/{channel} left for the handler to fill.
+
+    Calling t() without kwargs returns the raw translation pattern, so the
+    placeholders survive into the template and one .format() per /start
+    fills them in.
+    """
+    return (
+        f"🎉 **{t('welcome.title')}**\n"
+        "\n"
+        f"👋 {t('welcome.greeting')}\n"
+        f"🤖 {t('welcome.agent')}\n"
+        f"📍 {t('welcome.channel')}\n"
+        "\n"
+        f"{t('welcome.hint')}"
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _help_text() -> str:
+    """Help message; fully static per process, rendered once."""
+    return f"""📚 **{t("help.title")}**
+
+**{t("help.quick_start")}**
+• {t("help.quick_start_panel")}
+• {t("help.quick_start_chat")}
+
+**{t("help.panel_features")}**
+• 📋 {t("help.feature_resume")}
+• 🛑 {t("help.feature_stop")}
+• 📁 {t("help.feature_cwd")}
+• 📊 {t("help.feature_diff")}
+• 🔄 {t("help.feature_clear")}
+• 🤖 {t("help.feature_agent")}
+
+**{t("help.tips_title")}**
+• {t("help.tip_thread")}
+• {t("help.tip_parallel")}
+• {t("help.tip_quick_stop")}
+"""
+
+
+@functools.lru_cache(maxsize=4)
+def _text_welcome_static_lines(formatter, agent_display_name: str) -> Tuple[str, ...]:
+    """Static tail of the text welcome message (commands + how-it-works).
+
+    Only depends on the formatter and the agent display name, so it is
+    rendered once per (formatter, agent) pair instead of on every /start.
+    """
+    format_text = formatter.format_text
+    return (
+        "",
+        formatter.format_bold("Commands:"),
+        format_text("@Slack Coder /start - Show this message"),
+        format_text("@Slack Coder /clear - Reset session and start fresh"),
+        format_text("@Slack Coder /cwd - Show current working directory"),
+        format_text("@Slack Coder /set_cwd <path> - Set working directory"),
+        format_text("@Slack Coder /settings - Personalization settings"),
+        format_text(f"@Slack Coder /stop - Interrupt {agent_display_name} execution"),
+        "",
+        formatter.format_bold("How it works:"),
+        format_text(
+            f"• Send any message and it's immediately sent to {agent_display_name}"
+        ),
+        format_text("• Each chat maintains its own conversation context"),
+        format_text("• Use /clear to reset the conversation"),
+    )
+
+
 class CommandHandlers:
     """Handles all bot command operations"""
 
@@ -26,6 +170,9 @@ class CommandHandlers:
         """Get context for channel messages (no thread)"""
         # For Slack: send command responses directly to channel, not in thread
         if self.config.platform == "slack":
+            if context.thread_id is None:
+                # Already a bare channel context; reuse it instead of copying.
+                return context
             return MessageContext(
                 user_id=context.user_id,
                 channel_id=context.channel_id,
@@ -39,17 +186,18 @@ class CommandHandlers:
         """Handle /start command with interactive buttons"""
         platform_name = self.config.platform.capitalize()
 
-        # Get user and channel info
-        try:
-            user_info = await self.im_client.get_user_info(context.user_id)
-        except Exception as e:
-            logger.warning(f"Failed to get user info: {e}")
+        # Get user and channel info concurrently; the two API calls are
+        # independent, so their latencies overlap instead of adding up.
+        user_info, channel_info = await asyncio.gather(
+            self.im_client.get_user_info(context.user_id),
+            self.im_client.get_channel_info(context.channel_id),
+            return_exceptions=True,
+        )
+        if isinstance(user_info, BaseException):
+            logger.warning(f"Failed to get user info: {user_info}")
             user_info = {"id": context.user_id}
-
-        try:
-            channel_info = await self.im_client.get_channel_info(context.channel_id)
-        except Exception as e:
-            logger.warning(f"Failed to get channel info: {e}")
+        if isinstance(channel_info, BaseException):
+            logger.warning(f"Failed to get channel info: {channel_info}")
             channel_info = {
                 "id": context.channel_id,
                 "name": (
@@ -68,43 +216,20 @@ class CommandHandlers:
         # For non-Slack platforms, use traditional text message
         if self.config.platform != "slack":
             formatter = self.im_client.formatter
+            format_text = formatter.format_text
+            format_code_inline = formatter.format_code_inline
 
-            # Build welcome message using formatter to handle escaping properly
+            # Build welcome message using formatter to handle escaping properly;
+            # only the header varies per user, the rest comes from the cache.
             lines = [
                 formatter.format_bold("Welcome to Slack Coder!"),
                 "",
-                f"Platform: {formatter.format_text(platform_name)}",
-                f"Agent: {formatter.format_text(agent_display_name)}",
-                f"User ID: {formatter.format_code_inline(context.user_id)}",
-                f"Channel/Chat ID: {formatter.format_code_inline(context.channel_id)}",
-                "",
-                formatter.format_bold("Commands:"),
-                formatter.format_text("@Slack Coder /start - Show this message"),
-                formatter.format_text(
-                    "@Slack Coder /clear - Reset session and start fresh"
-                ),
-                formatter.format_text(
-                    "@Slack Coder /cwd - Show current working directory"
-                ),
-                formatter.format_text(
-                    "@Slack Coder /set_cwd <path> - Set working directory"
-                ),
-                formatter.format_text(
-                    "@Slack Coder /settings - Personalization settings"
-                ),
-                formatter.format_text(
-                    f"@Slack Coder /stop - Interrupt {agent_display_name} execution"
-                ),
-                "",
-                formatter.format_bold("How it works:"),
-                formatter.format_text(
-                    f"• Send any message and it's immediately sent to {agent_display_name}"
-                ),
-                formatter.format_text(
-                    "• Each chat maintains its own conversation context"
-                ),
-                formatter.format_text("• Use /clear to reset the conversation"),
+                f"Platform: {format_text(platform_name)}",
+                f"Agent: {format_text(agent_display_name)}",
+                f"User ID: {format_code_inline(context.user_id)}",
+                f"Channel/Chat ID: {format_code_inline(context.channel_id)}",
             ]
+            lines.extend(_text_welcome_static_lines(formatter, agent_display_name))
 
             message_text = formatter.format_message(*lines)
             channel_context = self._get_channel_context(context)
@@ -114,45 +239,21 @@ class CommandHandlers:
         # For Slack, create interactive buttons using Block Kit
         user_name = user_info.get("real_name") or user_info.get("name") or "User"
 
-        buttons = [
-            [
-                InlineButton(
-                    text=t("buttons.resume_session"), callback_data="cmd_resume"
-                ),
-                InlineButton(text=t("buttons.git_diff"), callback_data="cmd_diff"),
-            ],
-            [
-                InlineButton(text=t("buttons.current_dir"), callback_data="cmd_cwd"),
-                InlineButton(
-                    text=t("buttons.change_dir"), callback_data="cmd_change_cwd"
-                ),
-            ],
-            [
-                InlineButton(
-                    text=t("buttons.agent_settings"), callback_data="cmd_routing"
-                ),
-                InlineButton(text=t("buttons.settings"), callback_data="cmd_settings"),
-            ],
-        ]
-
-        keyboard = InlineKeyboard(buttons=buttons)
-
-        welcome_text = f"""🎉 **{t("welcome.title")}**
-
-👋 {t("welcome.greeting", name=user_name)}
-🤖 {t("welcome.agent", agent=agent_display_name)}
-📍 {t("welcome.channel", channel=channel_info.get("name", "Unknown"))}
-
-{t("welcome.hint")}"""
+        welcome_text = _slack_welcome_template().format(
+            name=user_name,
+            agent=agent_display_name,
+            channel=channel_info.get("name", "Unknown"),
+        )
 
         # Send command response to channel (not in thread)
         channel_context = self._get_channel_context(context)
         await self.im_client.send_message_with_buttons(
-            channel_context, welcome_text, keyboard
+            channel_context, welcome_text, _slack_welcome_keyboard()
         )
 
     async def handle_clear(self, context: MessageContext, args: str = ""):
         """Handle clear command - clears all sessions across configured agents"""
+        channel_context = self._get_channel_context(context)
         try:
             # Get the correct settings key (channel_id for Slack, not user_id)
             settings_key = self.controller._get_settings_key(context)
@@ -171,14 +272,12 @@ class CommandHandlers:
                     f"✅ {t('session.cleared')}\n{details}\n🔄 {t('session.all_reset')}"
                 )
 
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(channel_context, full_response)
             logger.info(f"Sent clear response to user {context.user_id}")
 
         except Exception as e:
             logger.error(f"Error clearing session: {e}", exc_info=True)
             try:
-                channel_context = self._get_channel_context(context)
                 await self.im_client.send_message(
                     channel_context,
                     f"❌ {t('errors.clear_session_error', error=str(e))}",
@@ -190,6 +289,7 @@ class CommandHandlers:
 
     async def handle_cwd(self, context: MessageContext, args: str = ""):
         """Handle cwd command - show current working directory"""
+        channel_context = self._get_channel_context(context)
         try:
             # Get CWD based on context (channel/chat)
             absolute_path = self.controller.get_cwd(context)
@@ -214,75 +314,60 @@ class CommandHandlers:
             # Combine all parts
             response_text = path_line + "\n" + "\n".join(status_lines)
 
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(channel_context, response_text)
         except Exception as e:
             logger.error(f"Error getting cwd: {e}")
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(
                 channel_context, f"❌ {t('errors.get_cwd_error', error=str(e))}"
             )
 
     async def handle_set_cwd(self, context: MessageContext, args: str):
         """Handle set_cwd command - change working directory"""
+        channel_context = self._get_channel_context(context)
         try:
             if not args:
-                channel_context = self._get_channel_context(context)
                 await self.im_client.send_message(channel_context, t("cwd.usage"))
                 return
 
             new_path = args.strip()
 
-            # Expand user path and get absolute path
-            expanded_path = os.path.expanduser(new_path)
-            absolute_path = os.path.abspath(expanded_path)
-
-            # Check if directory exists
-            if not os.path.exists(absolute_path):
-                # Try to create it
-                try:
-                    os.makedirs(absolute_path, exist_ok=True)
-                    logger.info(f"Created directory: {absolute_path}")
-                except Exception as e:
-                    channel_context = self._get_channel_context(context)
-                    await self.im_client.send_message(
-                        channel_context,
-                        f"❌ {t('errors.cannot_create_dir', error=str(e))}",
-                    )
-                    return
-
-            if not os.path.isdir(absolute_path):
-                formatter = self.im_client.formatter
-                error_text = f"❌ {t('errors.path_not_directory', path=formatter.format_code_inline(absolute_path))}"
-                channel_context = self._get_channel_context(context)
-                await self.im_client.send_message(channel_context, error_text)
+            # Resolve and validate in one worker-thread hop instead of a
+            # separate to_thread round trip per syscall.
+            formatter = self.im_client.formatter
+            absolute_path, resolve_error = await asyncio.to_thread(
+                _resolve_cwd, new_path, formatter
+            )
+            if resolve_error:
+                await self.im_client.send_message(
+                    channel_context, f"❌ {resolve_error}"
+                )
                 return
 
             # Save to user settings
             settings_key = self.controller._get_settings_key(context)
             self.settings_manager.set_custom_cwd(settings_key, absolute_path)
+            # Path was just validated above, so later get_cwd calls can be
+            # pure cache lookups with no filesystem IO on the event loop.
+            self.controller.prime_cwd(settings_key, absolute_path)
 
             logger.info(f"User {context.user_id} changed cwd to: {absolute_path}")
 
-            formatter = self.im_client.formatter
             response_text = (
                 f"✅ {t('cwd.changed')}\n{formatter.format_code_inline(absolute_path)}"
             )
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(channel_context, response_text)
 
         except Exception as e:
             logger.error(f"Error setting cwd: {e}")
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(
                 channel_context, f"❌ {t('errors.set_cwd_error', error=str(e))}"
             )
 
     async def handle_change_cwd_modal(self, context: MessageContext):
         """Handle Change Work Dir button - open modal for Slack"""
+        channel_context = self._get_channel_context(context)
         if self.config.platform != "slack":
             # For non-Slack platforms, just send instructions
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(
                 channel_context,
                 f"📂 {t('cwd.use_command_hint')}",
@@ -306,14 +391,12 @@ class CommandHandlers:
                 )
             except Exception as e:
                 logger.error(f"Error opening change CWD modal: {e}")
-                channel_context = self._get_channel_context(context)
                 await self.im_client.send_message(
                     channel_context,
                     f"❌ {t('errors.failed_open_modal')}",
                 )
         else:
             # No trigger_id, show instructions
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(
                 channel_context,
                 f"📂 {t('cwd.click_button_hint')}",
@@ -355,8 +438,8 @@ class CommandHandlers:
             )
 
     async def handle_sessions(self, context: MessageContext, args: str = ""):
+        channel_context = self._get_channel_context(context)
         try:
-            channel_context = self._get_channel_context(context)
             working_path = self.controller.get_cwd(context)
 
             opencode_agent = self.controller.agent_service.agents.get("opencode")
@@ -386,6 +469,7 @@ class CommandHandlers:
             ]
 
             max_display = 10
+            fromts = datetime.fromtimestamp
             for i, session in enumerate(sessions[:max_display], 1):
                 session_id = session.get("id", "unknown")
                 title = session.get("title", "")
@@ -396,16 +480,10 @@ class CommandHandlers:
                 if title.startswith("vibe-remote:"):
                     title = ""
 
-                from datetime import datetime
-
                 if updated_ts:
-                    updated_str = datetime.fromtimestamp(updated_ts / 1000).strftime(
-                        "%Y-%m-%d %H:%M"
-                    )
+                    updated_str = fromts(updated_ts / 1000).strftime("%Y-%m-%d %H:%M")
                 elif created_ts:
-                    updated_str = datetime.fromtimestamp(created_ts / 1000).strftime(
-                        "%Y-%m-%d %H:%M"
-                    )
+                    updated_str = fromts(created_ts / 1000).strftime("%Y-%m-%d %H:%M")
                 else:
                     updated_str = ""
 
@@ -431,17 +509,16 @@ class CommandHandlers:
 
         except Exception as e:
             logger.error(f"Error listing sessions: {e}", exc_info=True)
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(
                 channel_context, f"❌ {t('errors.failed_get_sessions', error=str(e))}"
             )
 
     async def handle_diff(self, context: MessageContext, args: str = ""):
+        channel_context = self._get_channel_context(context)
         try:
-            channel_context = self._get_channel_context(context)
             working_path = self.controller.get_cwd(context)
 
-            if not os.path.isdir(os.path.join(working_path, ".git")):
+            if not _is_git_repo(working_path):
                 await self.im_client.send_message(
                     channel_context,
                     f"❌ {t('diff.not_git_repo', path=working_path)}",
@@ -473,39 +550,19 @@ class CommandHandlers:
 
         except Exception as e:
             logger.error(f"Error generating diff: {e}", exc_info=True)
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(channel_context, f"❌ {str(e)}")
 
     async def handle_help(self, context: MessageContext, args: str = ""):
         """Handle /help command - show available commands"""
         channel_context = self._get_channel_context(context)
 
-        help_text = f"""📚 **{t("help.title")}**
-
-**{t("help.quick_start")}**
-• {t("help.quick_start_panel")}
-• {t("help.quick_start_chat")}
-
-**{t("help.panel_features")}**
-• 📋 {t("help.feature_resume")}
-• 🛑 {t("help.feature_stop")}
-• 📁 {t("help.feature_cwd")}
-• 📊 {t("help.feature_diff")}
-• 🔄 {t("help.feature_clear")}
-• 🤖 {t("help.feature_agent")}
-
-**{t("help.tips_title")}**
-• {t("help.tip_thread")}
-• {t("help.tip_parallel")}
-• {t("help.tip_quick_stop")}
-"""
-
         await self.im_client.send_message(
-            channel_context, help_text, parse_mode="markdown"
+            channel_context, _help_text(), parse_mode="markdown"
         )
 
     async def handle_resume_modal(self, context: MessageContext):
         """Show session list in a modal"""
+        channel_context = self._get_channel_context(context)
         try:
             trigger_id = (
                 context.platform_specific.get("trigger_id")
@@ -514,7 +571,6 @@ class CommandHandlers:
             )
 
             if not trigger_id:
-                channel_context = self._get_channel_context(context)
                 await self.im_client.send_message(
                     channel_context, f"❌ {t('errors.failed_open_modal')}"
                 )
@@ -534,7 +590,11 @@ class CommandHandlers:
                 if agent_name == "claude":
                     from modules.claude_client import ClaudeClient
 
-                    sessions = ClaudeClient.list_sessions(working_path)
+                    # Session listing walks JSONL files on disk; keep that
+                    # off the event loop.
+                    sessions = await asyncio.to_thread(
+                        ClaudeClient.list_sessions, working_path
+                    )
                 elif agent_name == "opencode":
                     opencode_agent = self.controller.agent_service.agents.get(
                         "opencode"
@@ -557,7 +617,9 @@ class CommandHandlers:
                 if agent_name == "claude":
                     from modules.claude_client import ClaudeClient
 
-                    sessions = ClaudeClient.list_sessions(working_path)
+                    sessions = await asyncio.to_thread(
+                        ClaudeClient.list_sessions, working_path
+                    )
                 elif agent_name == "opencode":
                     opencode_agent = self.controller.agent_service.agents.get(
                         "opencode"
@@ -568,7 +630,6 @@ class CommandHandlers:
                         sessions = await server.list_sessions(working_path)
 
                 if not sessions:
-                    channel_context = self._get_channel_context(context)
                     await self.im_client.send_message(
                         channel_context,
                         f"📭 {t('session.no_sessions_found', agent=agent_name)}",
@@ -581,7 +642,6 @@ class CommandHandlers:
 
         except Exception as e:
             logger.error(f"Error showing sessions modal: {e}", exc_info=True)
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(
                 channel_context, f"❌ {t('errors.failed_get_sessions', error=str(e))}"
             )
@@ -590,8 +650,8 @@ class CommandHandlers:
         self, context: MessageContext, session_id: str, agent_name: str = "opencode"
     ):
         """Resume a specific session - show history and bind thread"""
+        channel_context = self._get_channel_context(context)
         try:
-            channel_context = self._get_channel_context(context)
             working_path = self.controller.get_cwd(context)
 
             if agent_name == "claude":
@@ -605,7 +665,6 @@ class CommandHandlers:
 
         except Exception as e:
             logger.error(f"Error resuming session: {e}", exc_info=True)
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(
                 channel_context, f"❌ {t('errors.failed_resume_session', error=str(e))}"
             )
@@ -672,7 +731,9 @@ class CommandHandlers:
     ):
         from modules.claude_client import ClaudeClient
 
-        target_session = ClaudeClient.get_session(session_id, working_path)
+        target_session = await asyncio.to_thread(
+            ClaudeClient.get_session, session_id, working_path
+        )
         if not target_session:
             await self.im_client.send_message(
                 channel_context,
@@ -681,7 +742,9 @@ class CommandHandlers:
             return
 
         display_name = target_session.get("title", "") or session_id[:12]
-        messages = ClaudeClient.get_session_messages(session_id, working_path)
+        messages = await asyncio.to_thread(
+            ClaudeClient.get_session_messages, session_id, working_path
+        )
         history_lines = self._format_claude_history(messages, display_name)
 
         message_ts = await self.im_client.send_message(
@@ -705,6 +768,7 @@ class CommandHandlers:
 
     def _format_opencode_history(self, messages: list, display_name: str) -> list:
         history_lines = [f"📋 **{t('session.resume_title', name=display_name)}**\n"]
+        append = history_lines.append
         msg_count = 0
         for msg in messages[-10:]:
             info = msg.get("info", {})
@@ -717,28 +781,31 @@ class CommandHandlers:
                     break
             if content and role in ("user", "assistant"):
                 role_icon = "👤" if role == "user" else "🤖"
-                content_preview = content.replace("\n", " ")[:100]
+                # Slice first so replace() only copies the 100-char preview,
+                # not the whole message body.
+                content_preview = content[:100].replace("\n", " ")
                 if len(content) > 100:
                     content_preview += "..."
-                history_lines.append(f"{role_icon} {content_preview}")
+                append(f"{role_icon} {content_preview}")
                 msg_count += 1
         if msg_count == 0:
-            history_lines.append(f"_({t('session.no_history')})_")
-        history_lines.append(f"\n---\n💬 **{t('session.resume_hint')}**")
+            append(f"_({t('session.no_history')})_")
+        append(f"\n---\n💬 **{t('session.resume_hint')}**")
         return history_lines
 
     def _format_claude_history(self, messages: list, display_name: str) -> list:
         history_lines = [f"📋 **{t('session.resume_title', name=display_name)}**\n"]
+        append = history_lines.append
         msg_count = 0
         for msg in messages[-10:]:
             msg_type = msg.get("type", "")
             if msg_type == "human":
                 content = msg.get("message", {}).get("content", "")
                 if content:
-                    content_preview = content.replace("\n", " ")[:100]
+                    content_preview = content[:100].replace("\n", " ")
                     if len(content) > 100:
                         content_preview += "..."
-                    history_lines.append(f"👤 {content_preview}")
+                    append(f"👤 {content_preview}")
                     msg_count += 1
             elif msg_type == "assistant":
                 content_blocks = msg.get("message", {}).get("content", [])
@@ -748,19 +815,19 @@ class CommandHandlers:
                         text_content = block.get("text", "")
                         break
                 if text_content:
-                    content_preview = text_content.replace("\n", " ")[:100]
+                    content_preview = text_content[:100].replace("\n", " ")
                     if len(text_content) > 100:
                         content_preview += "..."
-                    history_lines.append(f"🤖 {content_preview}")
+                    append(f"🤖 {content_preview}")
                     msg_count += 1
         if msg_count == 0:
-            history_lines.append(f"_({t('session.no_history')})_")
-        history_lines.append(f"\n---\n💬 **{t('session.resume_hint')}**")
+            append(f"_({t('session.no_history')})_")
+        append(f"\n---\n💬 **{t('session.resume_hint')}**")
         return history_lines
 
     async def handle_view_all_changes(self, context: MessageContext):
+        channel_context = self._get_channel_context(context)
         try:
-            channel_context = self._get_channel_context(context)
             working_path = self.controller.get_cwd(context)
 
             from core.gist_service import create_full_diff_gist
@@ -790,5 +857,4 @@ class CommandHandlers:
 
         except Exception as e:
             logger.error(f"Error viewing all changes: {e}", exc_info=True)
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(channel_context, f"❌ {str(e)}")
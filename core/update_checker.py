@@ -622,7 +622,8 @@ async def handle_update_button_click(
         return
 
     # Schedule the actual update in a background task to avoid blocking
-    asyncio.create_task(_do_update_from_button(controller, channel_id, message_ts))
+    # (spawned via the controller so a strong reference is retained)
+    controller._spawn(_do_update_from_button(controller, channel_id, message_ts))
 
 
 async def _do_update_from_button(
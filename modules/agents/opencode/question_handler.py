@@ -248,6 +248,7 @@ class OpenCodeQuestionHandler:
 
         if pending_thread_id and not request.context.thread_id:
             request.context.thread_id = pending_thread_id
+            request.context.refresh_derived_keys()
 
         try:
             question_count_int = int(question_count) if question_count is not None else 1
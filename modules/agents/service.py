@@ -13,9 +13,13 @@ class AgentService:
         self.controller = controller
         self.agents: Dict[str, BaseAgent] = {}
         self.default_agent = "claude"
+        # Bumped on every registration so callers can cache derived views
+        # (e.g. sorted backend lists) and invalidate cheaply.
+        self.registry_version = 0
 
     def register(self, agent: BaseAgent):
         self.agents[agent.name] = agent
+        self.registry_version += 1
         logger.info(f"Registered agent backend: {agent.name}")
 
     def get(self, agent_name: Optional[str]) -> BaseAgent:
@@ -3,7 +3,7 @@
 import logging
 from abc import ABC, abstractmethod
 from typing import Optional, Callable, Dict, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +19,26 @@ class MessageContext:
     message_id: Optional[str] = None
     platform_specific: Optional[Dict[str, Any]] = None
 
+    # Derived keys computed once at construction so hot message paths read
+    # plain attributes instead of re-deriving them per call.
+    settings_key: str = field(init=False, repr=False, compare=False)
+    thread_key: str = field(init=False, repr=False, compare=False)
+    trigger_key: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.refresh_derived_keys()
+
+    def refresh_derived_keys(self) -> None:
+        """Recompute derived keys; call after mutating the identifying fields.
+
+        settings_key: per-channel settings are keyed by the channel (Slack-first).
+        thread_key: the conversation container (thread, or channel outside threads).
+        trigger_key: the user message that triggered this round ("" when unknown).
+        """
+        self.settings_key = self.channel_id
+        self.thread_key = self.thread_id or self.channel_id
+        self.trigger_key = self.message_id or ""
+
 
 @dataclass
 class InlineButton:
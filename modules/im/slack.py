@@ -914,8 +914,13 @@ class SlackBot(BaseIMClient):
                             )
 
         elif payload.get("type") == "view_submission":
-            # Handle modal submissions asynchronously to avoid Slack timeouts
-            asyncio.create_task(self._handle_view_submission(payload))
+            # Handle modal submissions asynchronously to avoid Slack timeouts.
+            # Spawn via the controller when available so the task is strongly
+            # referenced and can't be garbage collected mid-flight.
+            if self._controller is not None:
+                self._controller._spawn(self._handle_view_submission(payload))
+            else:
+                asyncio.create_task(self._handle_view_submission(payload))
             return
 
     async def _handle_view_submission(self, payload: Dict[str, Any]):
@@ -1,7 +1,10 @@
-import logging
+import functools
 import hashlib
 import logging
+import sys
 import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from dataclasses import asdict, dataclass, field
 from typing import Any, Dict, List, Optional, Union
 from pathlib import Path
@@ -99,6 +102,9 @@ class SettingsManager:
         "tool": "toolcall",
     }
 
+    # Max (settings_key, message_type) pairs memoized for hidden-type checks
+    HIDDEN_CACHE_CAP = 256
+
     def __init__(self, settings_file: Optional[str] = None):
         paths.ensure_data_dirs()
         self.settings_file = (
@@ -107,6 +113,13 @@ class SettingsManager:
         self._settings_mtime_ns: Optional[int] = None
         self._settings_fingerprint: Optional[str] = None
         self.settings: Dict[Union[int, str], UserSettings] = {}
+        # Bumped on every load/save so memoized visibility checks expire
+        self._settings_version = 0
+        # batch_update() suppresses intermediate disk writes; a single
+        # save runs when the outermost batch exits (if anything changed).
+        self._batch_depth = 0
+        self._batch_dirty = False
+        self._hidden_cache: "OrderedDict[tuple, bool]" = OrderedDict()
         self.store = SettingsStore(self.settings_file)
         self.sessions_store = SessionsStore()
         self.sessions_store.load()
@@ -159,6 +172,7 @@ class SettingsManager:
         """Load settings from JSON file"""
         self.store = SettingsStore(self.settings_file)
         self.settings = {}
+        self._settings_version += 1
 
         if not self.store.settings.channels:
             logger.info("No settings file found, starting with empty settings")
@@ -208,6 +222,10 @@ class SettingsManager:
 
     def _save_settings(self):
         """Save settings to JSON file"""
+        self._settings_version += 1
+        if self._batch_depth:
+            self._batch_dirty = True
+            return
         try:
             channels: Dict[str, ChannelSettings] = {}
             for settings_key, settings in self.settings.items():
@@ -215,6 +233,7 @@ class SettingsManager:
                 channel_settings = self._to_channel_settings(settings)
                 if existing is not None:
                     channel_settings.enabled = existing.enabled
+                    channel_settings.require_mention = existing.require_mention
                 channels[str(settings_key)] = channel_settings
             self.store.settings.channels = channels
             self.store.save()
@@ -228,6 +247,23 @@ class SettingsManager:
         except Exception as e:
             logger.error(f"Error saving settings: {e}")
 
+    @contextmanager
+    def batch_update(self):
+        """Coalesce several mutations into a single disk write.
+
+        Saves triggered inside the block are deferred; one save runs when
+        the outermost block exits, and only if something actually changed.
+        Nestable.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._batch_dirty:
+                self._batch_dirty = False
+                self._save_settings()
+
     def get_user_settings(self, user_id: Union[int, str]) -> UserSettings:
         """Get settings for a specific user"""
         normalized_id = self._normalize_user_id(user_id)
@@ -298,8 +334,18 @@ class SettingsManager:
         """Check if a message type is hidden for user (not in show_message_types)"""
         self._reload_if_changed()
         message_type = self._canonicalize_message_type(message_type)
+        cache_key = (self._normalize_user_id(user_id), message_type)
+        cached = self._hidden_cache.get((*cache_key, self._settings_version))
+        if cached is not None:
+            return cached
         settings = self.get_user_settings(user_id)
-        return message_type not in settings.show_message_types
+        hidden = message_type not in settings.show_message_types
+        # get_user_settings may have saved defaults and bumped the version;
+        # key on the current version so the entry stays valid.
+        self._hidden_cache[(*cache_key, self._settings_version)] = hidden
+        while len(self._hidden_cache) > self.HIDDEN_CACHE_CAP:
+            self._hidden_cache.popitem(last=False)
+        return hidden
 
     def save_user_settings(self, user_id: Union[int, str], settings: UserSettings):
         """Save settings for a specific user (alias for update_user_settings)"""
@@ -350,9 +396,17 @@ class SettingsManager:
         agent_map = self.sessions_store.get_agent_map(user_key, agent_name)
         return agent_map.get(thread_id)
 
-    def _canonicalize_message_type(self, message_type: str) -> str:
-        """Normalize message type to canonical form to support aliases."""
-        return self.MESSAGE_TYPE_ALIASES.get(message_type, message_type)
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _canonicalize_message_type(message_type: str) -> str:
+        """Normalize message type to canonical form to support aliases.
+
+        Returns interned strings so callers can rely on fast identity-based
+        comparisons against the canonical type constants.
+        """
+        return sys.intern(
+            SettingsManager.MESSAGE_TYPE_ALIASES.get(message_type, message_type)
+        )
 
     def _normalize_show_message_types(
         self, show_message_types: Optional[List[str]]
@@ -616,7 +670,12 @@ class SettingsManager:
         key = str(channel_id)
         channel_settings = self.store.get_channel(key)
         channel_settings.require_mention = value
-        self.store.update_channel(key, channel_settings)
+        if self._batch_depth:
+            # The flush at the end of the batch persists the store in one write.
+            self.store.settings.channels[key] = channel_settings
+            self._batch_dirty = True
+        else:
+            self.store.update_channel(key, channel_settings)
         logger.info(f"Updated require_mention for channel {key}: {value}")
 
     def get_require_mention_override(
@@ -0,0 +1,96 @@
+import asyncio
+import subprocess
+
+from core.gist_service import _split_patch_with_stat, get_git_diff
+
+
+SAMPLE_STAT = (
+    " file1.py | 2 +-\n"
+    " file2.py | 4 ++--\n"
+    " 2 files changed, 3 insertions(+), 3 deletions(-)"
+)
+SAMPLE_PATCH = (
+    "diff --git a/file1.py b/file1.py\n"
+    "index 1111111..2222222 100644\n"
+    "--- a/file1.py\n"
+    "+++ b/file1.py\n"
+    "@@ -1,2 +1,2 @@\n"
+    " a\n"
+    "-b\n"
+    "+c\n"
+)
+
+
+class TestSplitPatchWithStat:
+    def test_normal_output(self):
+        output = SAMPLE_STAT + "\n" + SAMPLE_PATCH
+        stat, patch = _split_patch_with_stat(output)
+        assert stat == SAMPLE_STAT.strip()
+        assert patch == SAMPLE_PATCH
+
+    def test_empty_output(self):
+        assert _split_patch_with_stat("") == ("", "")
+
+    def test_stat_only_output(self):
+        stat, patch = _split_patch_with_stat(SAMPLE_STAT + "\n")
+        assert stat == SAMPLE_STAT.strip()
+        assert patch == ""
+
+    def test_patch_without_stat(self):
+        stat, patch = _split_patch_with_stat(SAMPLE_PATCH)
+        assert stat == ""
+        assert patch == SAMPLE_PATCH
+
+
+def _init_repo_with_commit(path, content="a\nb\n"):
+    subprocess.run(["git", "init", "-q"], cwd=path, check=True)
+    (path / "f.py").write_text(content)
+    subprocess.run(["git", "add", "f.py"], cwd=path, check=True)
+    subprocess.run(
+        [
+            "git",
+            "-c",
+            "user.email=test@example.com",
+            "-c",
+            "user.name=test",
+            "commit",
+            "-q",
+            "-m",
+            "init",
+        ],
+        cwd=path,
+        check=True,
+    )
+
+
+class TestGetGitDiff:
+    def test_repo_with_changes(self, tmp_path):
+        _init_repo_with_commit(tmp_path)
+        (tmp_path / "f.py").write_text("a\nchanged\n")
+
+        stat, diff, truncated = asyncio.run(get_git_diff(str(tmp_path)))
+
+        assert "f.py" in stat
+        assert "1 file changed" in stat
+        assert diff.startswith("diff --git a/f.py b/f.py")
+        assert "+changed" in diff
+        assert truncated is False
+
+    def test_clean_repo(self, tmp_path):
+        _init_repo_with_commit(tmp_path)
+
+        stat, diff, truncated = asyncio.run(get_git_diff(str(tmp_path)))
+
+        assert stat == ""
+        assert diff == ""
+        assert truncated is False
+
+    def test_truncated_past_max_bytes(self, tmp_path):
+        _init_repo_with_commit(tmp_path)
+        (tmp_path / "f.py").write_text("x\n" * 10000)
+
+        stat, diff, truncated = asyncio.run(
+            get_git_diff(str(tmp_path), max_bytes=64)
+        )
+
+        assert truncated is True
@@ -0,0 +1,64 @@
+from config import paths
+from modules.settings_manager import ChannelRouting, SettingsManager
+
+
+def make_manager(tmp_path, monkeypatch) -> SettingsManager:
+    monkeypatch.setattr(paths, "get_vibe_remote_dir", lambda: tmp_path / ".vibe_remote")
+    return SettingsManager()
+
+
+class TestBatchUpdate:
+    def test_batched_updates_save_once_and_round_trip(self, tmp_path, monkeypatch):
+        manager = make_manager(tmp_path, monkeypatch)
+
+        save_calls = []
+        original_save = manager.store.save
+
+        def counting_save():
+            save_calls.append(1)
+            original_save()
+
+        monkeypatch.setattr(manager.store, "save", counting_save)
+
+        with manager.batch_update():
+            manager.set_channel_routing(
+                "C123", ChannelRouting(agent_backend="codex")
+            )
+            manager.set_require_mention("C123", True)
+            # Nothing may hit disk while the batch is open
+            assert save_calls == []
+
+        assert save_calls == [1]
+
+        reloaded = make_manager(tmp_path, monkeypatch)
+        routing = reloaded.get_channel_routing("C123")
+        assert routing is not None
+        assert routing.agent_backend == "codex"
+        assert reloaded.get_require_mention("C123", global_default=False) is True
+
+    def test_batch_update_without_changes_writes_nothing(
+        self, tmp_path, monkeypatch
+    ):
+        manager = make_manager(tmp_path, monkeypatch)
+
+        save_calls = []
+        monkeypatch.setattr(
+            manager.store, "save", lambda: save_calls.append(1)
+        )
+
+        with manager.batch_update():
+            pass
+
+        assert save_calls == []
+
+    def test_require_mention_survives_unrelated_save(self, tmp_path, monkeypatch):
+        manager = make_manager(tmp_path, monkeypatch)
+
+        manager.set_require_mention("C9", True)
+        # A full settings save rebuilds the channels map from UserSettings;
+        # require_mention must be carried over from the stored channel.
+        manager.set_custom_cwd("C9", "/tmp/project")
+
+        reloaded = make_manager(tmp_path, monkeypatch)
+        assert reloaded.get_require_mention("C9", global_default=False) is True
+        assert reloaded.get_custom_cwd("C9") == "/tmp/project"